@@ -0,0 +1,103 @@
+"""
+Measures glamira CLI startup with `python -X importtime`: the bare CLI, each stage
+with only the script modules it lazy-loads, and all script modules imported eagerly
+(what a process running every script at once used to pay). Reports total import
+time, wall time and the slowest imports of each case.
+
+    python benchmarks/bench_cli_startup.py --runs 5
+
+Stages whose dependencies are not installed are reported with their import error.
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from run_pipeline_benchmark import SRC_DIR, write_configs
+
+sys.path.insert(0, SRC_DIR)
+import glamira
+
+TOP_IMPORTS = 10
+
+
+def case_code(modules):
+    imports = "".join(f"importlib.import_module({module!r}); " for module in modules)
+    return f"import importlib, glamira; glamira.build_parser(); {imports}"
+
+
+def parse_importtime(stderr):
+    """
+    Returns {module: (self µs, cumulative µs)} from `-X importtime` output.
+    """
+
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_case(workdir, modules, runs):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", case_code(modules)],
+                                 cwd=workdir, env=env, capture_output=True, text=True)
+        wall_seconds = time.perf_counter() - start
+        if process.returncode != 0:
+            return {"error": process.stderr.strip().splitlines()[-1]}
+        imports = parse_importtime(process.stderr)
+        total_ms = sum(self_us for self_us, _ in imports.values()) / 1000
+        if best is None or total_ms < best["import_ms"]:
+            slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:TOP_IMPORTS]
+            best = {
+                "import_ms": round(total_ms, 1),
+                "wall_ms": round(wall_seconds * 1000, 1),
+                "modules": len(imports),
+                "slowest_self_ms": {name: round(self_us / 1000, 1) for name, (self_us, _) in slowest},
+            }
+    return best
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="glamira_startup_")
+    write_configs(workdir, "mongodb://localhost:27017", 10000)
+
+    all_modules = sorted({module for modules in glamira.STAGE_MODULES.values() for module in modules})
+    cases = {"cli": []}
+    cases.update(glamira.STAGE_MODULES)
+    cases["all_scripts"] = all_modules
+
+    results = {}
+    for name, modules in cases.items():
+        results[name] = measure_case(workdir, modules, args.runs)
+        summary = results[name].get("error") or f"{results[name]['import_ms']} ms imports, {results[name]['wall_ms']} ms wall"
+        print(f"{name}: {summary}")
+
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "cases": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure CLI startup with -X importtime.")
+    parser.add_argument("--runs", type=int, default=3, help="runs per case; the fastest is reported")
+    parser.add_argument("--output", default="bench_cli_startup.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    report = run_benchmark(args)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}")
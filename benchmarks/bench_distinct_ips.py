@@ -0,0 +1,92 @@
+"""
+Compares distinct-IP extraction strategies of process_ip_locations on synthetic events:
+the server-side `$group` pipeline against the client-side packed-array extractor
+(sort/unique and, with --bitmap, the IPv4 bitmap). Reports wall time and peak RSS
+(getrusage, as in run_pipeline_benchmark.py) per strategy and checks that all of them
+return the same IPs.
+
+    python benchmarks/bench_distinct_ips.py --events 1000000 --mongodb-uri mongodb://localhost:27017
+
+The peak is only the strategy's own when `peak_rss_is_stage_peak` is true in the JSON
+report; otherwise it is the process high-water mark so far. The extractor's workers are
+threads, so their memory is part of the same RSS. With mongomock the `$group` runs
+in-process and is included too; against a real mongod the server-side cost shows up as
+wall time only.
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import local_stand_ins
+from run_pipeline_benchmark import BENCH_DB, measure, seed_userbeh, write_configs
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="glamira_bench_")
+    write_configs(workdir, args.mongodb_uri or "mongodb://stand-in", 10000)
+    os.chdir(workdir)
+
+    import pymongo
+    if args.mongodb_uri is None:
+        pymongo.MongoClient = local_stand_ins.mongomock_client_factory()
+    sys.modules.setdefault("IP2Location", local_stand_ins.ip2location_module)
+
+    generate_events = importlib.import_module("py_scripts_generate_events").generate_events
+    ip_locations = importlib.import_module("py_scripts_process_ip_locations")
+    distinct_ips = importlib.import_module("distinct_ips")
+
+    client = pymongo.MongoClient(args.mongodb_uri)
+    client.drop_database(BENCH_DB)
+    collection = client[BENCH_DB]["userbeh"]
+    seed_start = time.perf_counter()
+    seed_userbeh(client[BENCH_DB], generate_events, args.events, "https://www.glamira.de")
+    print(f"Seeded {args.events} events in {time.perf_counter() - seed_start:.2f}s")
+
+    results = {}
+    found = {}
+
+    def run(strategy, extract):
+        def collect():
+            found[strategy] = list(extract())
+            return len(found[strategy])
+        measure(results, strategy, collect)
+
+    run("group", lambda: ip_locations.distinct_ips_group(collection))
+    run("packed_sort", lambda: distinct_ips.distinct_ips(collection, args.workers, "sort"))
+    if args.bitmap:
+        run("packed_bitmap", lambda: distinct_ips.distinct_ips(collection, args.workers, "bitmap"))
+    client.close()
+
+    expected = set(found["group"]) - {None}
+    for strategy, ips in found.items():
+        if strategy != "group" and set(ips) != expected:
+            raise SystemExit(f"{strategy} returned {len(set(ips))} IPs, expected {len(expected)}")
+
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "events": args.events,
+        "workers": args.workers,
+        "mongodb": "local" if args.mongodb_uri else "mongomock",
+        "stages": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark $group against packed distinct-IP extraction.")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bitmap", action="store_true", help="also run the 512 MiB IPv4 bitmap dedupe")
+    parser.add_argument("--mongodb-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--output", default="bench_distinct_ips.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    report = run_benchmark(args)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}")
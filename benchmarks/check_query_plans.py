@@ -0,0 +1,69 @@
+"""
+Query plan regression check: seeds a local mongod with synthetic events, ensures the
+indexes declared in src/mongo_indexes.py and explains every pipeline query. Exits
+non-zero if a query falls back to a collection scan or loses its covered plan.
+
+    python benchmarks/check_query_plans.py --mongodb-uri mongodb://localhost:27017
+
+Needs a real mongod: mongomock does not implement explain().
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import sys
+import time
+
+from run_pipeline_benchmark import BENCH_DB, seed_userbeh
+
+
+def run_check(args):
+    import pymongo
+
+    generate_events = importlib.import_module("py_scripts_generate_events").generate_events
+    mongo_indexes = importlib.import_module("mongo_indexes")
+
+    client = pymongo.MongoClient(args.mongodb_uri)
+    try:
+        client.drop_database(BENCH_DB)
+        db = client[BENCH_DB]
+        seed_start = time.perf_counter()
+        seed_userbeh(db, generate_events, args.events, "https://www.glamira.de")
+        print(f"Seeded {args.events} events in {time.perf_counter() - seed_start:.2f}s")
+
+        created = mongo_indexes.ensure_indexes(db)
+        # A second run must be a no-op
+        if mongo_indexes.ensure_indexes(db):
+            raise SystemExit("ensure_indexes is not idempotent")
+        results = mongo_indexes.check_plans(db)
+    finally:
+        client.close()
+
+    for result in results:
+        status = "ok" if result["ok"] else f"REGRESSED ({result['problem']})"
+        print(f"{result['name']}: {' > '.join(result['stages'])} {status}")
+
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "events": args.events,
+        "indexes_created": created,
+        "plans": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a pipeline query plan regresses.")
+    parser.add_argument("--mongodb-uri", required=True, help="local mongod (mongomock has no explain)")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--output", default="query_plans.json")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    report = run_check(args)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}")
+
+    if not all(result["ok"] for result in report["plans"]):
+        sys.exit(1)
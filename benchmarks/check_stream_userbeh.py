@@ -0,0 +1,221 @@
+"""
+End-to-end check of py_scripts_stream_userbeh.py against a single-node replica set.
+Starts a throwaway `mongod --replSet` (or uses --mongodb-uri of an existing replica set),
+runs the stream with the file sink, inserts generated events and checks that every event
+arrives as exactly one row. It then stops the stream, inserts more events while it is down
+and restarts it, so the resume token must pick up exactly the missed events.
+
+    python benchmarks/check_stream_userbeh.py --events 2000
+
+Exits non-zero when rows are missing, duplicated or the stream does not stop cleanly.
+Needs a mongod binary on PATH (or --mongod): mongomock has no change streams.
+"""
+import argparse
+import datetime
+import glob
+import importlib
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from run_pipeline_benchmark import BENCH_DB, SRC_DIR, write_configs
+
+sys.path.insert(0, SRC_DIR)
+STREAM_SCRIPT = os.path.join(SRC_DIR, "py_scripts_stream_userbeh.py")
+REPLICA_SET = "rs0"
+BATCH_SIZE = 500
+
+
+def wait_for(condition, timeout, what, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Process {process.args[0]} exited with code {process.returncode} while waiting for {what}")
+        if condition():
+            return
+        time.sleep(0.2)
+    raise SystemExit(f"Timed out after {timeout}s waiting for {what}")
+
+
+def start_replica_set(mongod, workdir):
+    """
+    Starts a single-node replica set on a free port. Returns (process, uri).
+    """
+
+    import pymongo
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    dbpath = os.path.join(workdir, "db")
+    os.makedirs(dbpath)
+    with open(os.path.join(workdir, "mongod.log"), 'w') as log:
+        try:
+            process = subprocess.Popen([mongod, "--replSet", REPLICA_SET, "--port", str(port), "--bind_ip", "127.0.0.1",
+                                        "--dbpath", dbpath], stdout=log, stderr=subprocess.STDOUT)
+        except FileNotFoundError:
+            raise SystemExit(f"{mongod} not found: pass --mongod or the --mongodb-uri of a replica set")
+
+    uri = f"mongodb://127.0.0.1:{port}/?directConnection=true"
+    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=1000)
+    try:
+        wait_for(lambda: ping(client), 30, "mongod to start", process)
+        client.admin.command("replSetInitiate", {"_id": REPLICA_SET, "members": [{"_id": 0, "host": f"127.0.0.1:{port}"}]})
+        wait_for(lambda: client.admin.command("hello").get("isWritablePrimary"), 30, "the replica set primary")
+    finally:
+        client.close()
+    return process, uri
+
+
+def ping(client):
+    try:
+        client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+def insert_events(collection, count, seed):
+    from bson import json_util
+
+    generate_events = importlib.import_module("py_scripts_generate_events").generate_events
+    documents = [json_util.loads(json.dumps(event)) for event in generate_events(count, seed)]
+    collection.insert_many(documents, ordered=False)
+    return {str(document["_id"]) for document in documents}
+
+
+def read_rows(output_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "*.jsonl"))):
+        with open(path, encoding='utf-8') as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+class StreamProcess:
+    """
+    Runs the streaming script with the file sink in `workdir` and stops it with SIGTERM.
+    """
+
+    def __init__(self, workdir, output_dir):
+        self.workdir = workdir
+        self.output_dir = output_dir
+        self.process = None
+
+    def start(self):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+        with open(os.path.join(self.workdir, "stream.log"), 'a') as log:
+            self.process = subprocess.Popen(
+                [sys.executable, STREAM_SCRIPT, "--sink", "file", "--output-dir", self.output_dir,
+                 "--batch-size", str(BATCH_SIZE), "--batch-seconds", "1"],
+                cwd=self.workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        return self.process.wait(timeout=30)
+
+
+def run_check(args):
+    import pymongo
+
+    workdir = tempfile.mkdtemp(prefix="glamira_stream_check_")
+    mongod_process = None
+    try:
+        if args.mongodb_uri:
+            uri = args.mongodb_uri
+        else:
+            mongod_process, uri = start_replica_set(args.mongod, workdir)
+        write_configs(workdir, uri, BATCH_SIZE)
+        output_dir = os.path.join(workdir, "batches")
+        token_path = os.path.join(workdir, "stream_resume_token.json")
+
+        client = pymongo.MongoClient(uri)
+        try:
+            client.drop_database(BENCH_DB)
+            collection = client[BENCH_DB]["userbeh"]
+            stream = StreamProcess(workdir, output_dir)
+            problems = []
+
+            # Phase 1: events inserted while the stream runs
+            stream.start()
+            # The idle loop saves a resume token once the change stream is open
+            wait_for(lambda: os.path.exists(token_path), 60, "the change stream to open", stream.process)
+            expected = insert_events(collection, args.events, seed=1)
+            wait_for(lambda: len(read_rows(output_dir)) >= len(expected), args.timeout, f"{len(expected)} streamed rows",
+                     stream.process)
+            if stream.stop() != 0:
+                problems.append(f"stream exited with code {stream.process.returncode} on SIGTERM")
+            first_rows = len(read_rows(output_dir))
+
+            # Phase 2: events inserted while the stream is down are picked up from the resume token
+            expected |= insert_events(collection, args.events // 2, seed=2)
+            stream.start()
+            wait_for(lambda: len(read_rows(output_dir)) >= len(expected), args.timeout, f"{len(expected)} streamed rows",
+                     stream.process)
+            # Give a replay of already delivered events time to show up before stopping
+            time.sleep(2)
+            if stream.stop() != 0:
+                problems.append(f"restarted stream exited with code {stream.process.returncode} on SIGTERM")
+        finally:
+            client.close()
+
+        record_ids = [row["record_id"] for row in read_rows(output_dir)]
+        missing = expected - set(record_ids)
+        duplicates = len(record_ids) - len(set(record_ids))
+        unexpected = set(record_ids) - expected
+        if missing:
+            problems.append(f"{len(missing)} events never arrived")
+        if duplicates:
+            problems.append(f"{duplicates} events arrived more than once")
+        if unexpected:
+            problems.append(f"{len(unexpected)} rows match no inserted event")
+        if not os.path.exists(token_path):
+            problems.append("no resume token was saved")
+    finally:
+        if mongod_process is not None:
+            mongod_process.terminate()
+            mongod_process.wait(timeout=30)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    print(f"Streamed {len(record_ids)} rows for {len(expected)} events ({first_rows} before the restart)")
+
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "events": len(expected),
+        "rows": len(record_ids),
+        "rows_before_restart": first_rows,
+        "problems": problems,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the userbeh change stream end to end on a replica set.")
+    parser.add_argument("--mongodb-uri", help="existing replica set to use instead of starting mongod")
+    parser.add_argument("--mongod", default="mongod", help="mongod binary for the throwaway replica set")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the rows of each phase")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the logs, batches and database files")
+    parser.add_argument("--output", default="stream_check.json")
+    args = parser.parse_args()
+
+    # The Cloud Functions ship copies of the shared modules; refuse to measure code they would not deploy
+    if importlib.import_module("py_scripts_sync_function_modules").sync_function_modules(check=True):
+        sys.exit(1)
+
+    output_path = os.path.abspath(args.output)
+    report = run_check(args)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}")
+
+    if report["problems"]:
+        sys.exit(1)
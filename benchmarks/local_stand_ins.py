@@ -0,0 +1,154 @@
+"""
+Local stand-ins for the external services the pipeline stages talk to:
+a mongomock client factory, a filesystem-backed GCS client, a deterministic
+IP2Location reader and a threaded HTTP server serving product pages.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COUNTRIES = [("DE", "Germany", "Bayern", "Munich"), ("GB", "United Kingdom", "England", "London"),
+             ("FR", "France", "Ile-de-France", "Paris"), ("US", "United States", "California", "San Jose"),
+             ("AU", "Australia", "New South Wales", "Sydney"), ("PL", "Poland", "Mazowieckie", "Warsaw")]
+
+
+def mongomock_client_factory():
+    """
+    Returns a MongoClient replacement whose instances all share one in-memory server,
+    so data written by one stage is visible to the next.
+    """
+
+    import mongomock
+
+    client = mongomock.MongoClient()
+    return lambda *args, **kwargs: client
+
+
+class FilesystemBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.path, name)
+
+    def open(self, mode='r'):
+        if 'w' in mode:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return open(self.path, mode, encoding=None if 'b' in mode else 'utf-8')
+
+    def upload_from_string(self, data, content_type=None):
+        with self.open('wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+
+    def download_as_bytes(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def download_as_string(self):
+        return self.download_as_bytes()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class FilesystemBucket:
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        os.makedirs(self.path, exist_ok=True)
+
+    def blob(self, name):
+        return FilesystemBlob(self, name)
+
+    def copy_blob(self, blob, destination_bucket, new_name=None):
+        destination = destination_bucket.blob(new_name or blob.name)
+        os.makedirs(os.path.dirname(destination.path), exist_ok=True)
+        shutil.copyfile(blob.path, destination.path)
+        return destination
+
+    def delete_blob(self, name):
+        self.blob(name).delete()
+
+    def list_blobs(self, prefix=""):
+        return [self.blob(name) for name in sorted(os.listdir(self.path)) if name.startswith(prefix)]
+
+
+class FilesystemStorageClient:
+    """
+    Minimal google.cloud.storage.Client replacement storing every bucket as a directory under root.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def bucket(self, name):
+        return FilesystemBucket(self.root, name)
+
+
+class StandInIP2Location:
+    """
+    IP2Location.IP2Location replacement mapping every IP to a fixed record by hash.
+    """
+
+    def open(self, db_path):
+        pass
+
+    def close(self):
+        pass
+
+    def get_all(self, ip):
+        country_short, country_long, region, city = COUNTRIES[hashlib.md5(ip.encode()).digest()[0] % len(COUNTRIES)]
+        return types.SimpleNamespace(country_short=country_short, country_long=country_long, region=region, city=city)
+
+
+ip2location_module = types.SimpleNamespace(IP2Location=StandInIP2Location)
+
+
+class ProductPageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        slug = self.path.split("?")[0].strip("/").rsplit(".", 1)[0]
+        title = slug.replace("-", " ").title()
+        body = (f'<html><body><h1 class="page-title"><span class="base" data-ui-id="page-title-wrapper">'
+                f'{title}</span></h1></body></html>').encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ProductPageServer:
+    """
+    Serves a product page for every path on 127.0.0.1 from a background thread.
+    """
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ProductPageHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class InMemoryRowSink:
+    """
+    bigquery.Client replacement for insert_rows that only counts the rows it receives.
+    """
+
+    def __init__(self):
+        self.row_count = 0
+
+    def insert_rows(self, table, rows, selected_fields=None):
+        self.row_count += len(rows)
+        return []
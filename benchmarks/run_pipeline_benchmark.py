@@ -0,0 +1,233 @@
+"""
+End-to-end benchmark of the pipeline stages against local stand-ins.
+
+Seeds `userbeh` with synthetic events, then runs process_ip_locations, the product
+crawler (against a local HTTP server), both GCS exporters (against a filesystem
+bucket) and the raw_data process_data_chunk transform (into an in-memory sink).
+Throughput, wall time and peak RSS per stage (and of the stage's worker processes,
+e.g. the crawler's pool) are written as JSON so runs can be compared over time.
+Stages run untraced; memory comes from getrusage, with the peak reset between
+stages where Linux allows it.
+
+    python benchmarks/run_pipeline_benchmark.py --events 100000 --output bench_results.json
+"""
+import argparse
+import datetime
+import gc
+import importlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import types
+import urllib.parse
+
+import local_stand_ins
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+sys.path.insert(0, SRC_DIR)
+
+BENCH_DB = "glamira_bench"
+BENCH_BUCKET = "glamira_bench"
+SEED_BATCH_SIZE = 10000
+TRANSFORM_CHUNK_SIZE = 1000
+
+
+def write_configs(workdir, mongodb_uri, batch_size):
+    """
+    Writes concrete configs/*.ini files, read by the scripts relative to the working directory.
+    """
+
+    configs = {
+        "app_config.ini": {"app": {"batch_size": batch_size}},
+        "crawling_config.ini": {"crawling": {"checkpoint_file": "checkpoint.txt", "batch_size": batch_size}},
+        "gcs_config.ini": {"gcs": {"bucket": BENCH_BUCKET}},
+        "ip2location_config.ini": {"ip2location": {"db_path": "IP2LOCATION-STAND-IN.BIN"}},
+        "mongodb_config.ini": {"mongodb": {"uri": mongodb_uri, "database": BENCH_DB}},
+    }
+    os.makedirs(os.path.join(workdir, "configs"), exist_ok=True)
+    for file_name, sections in configs.items():
+        with open(os.path.join(workdir, "configs", file_name), 'w') as f:
+            for section, values in sections.items():
+                f.write(f"[{section}]\n")
+                for key, value in values.items():
+                    f.write(f"{key} = {value}\n")
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets the process's RSS high-water mark (Linux only)
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def max_rss_bytes(who):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return resource.getrusage(who).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def measure(results, stage, run):
+    """
+    Runs one stage and records its wall time, throughput and peak RSS, plus the peak RSS of
+    the largest worker process it waited for. `run` returns the number of records the stage produced.
+    """
+
+    gc.collect()
+    peak_reset = reset_peak_rss()
+    children_before = max_rss_bytes(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    records = run()
+    wall_time = time.perf_counter() - start
+    peak_memory = max_rss_bytes(resource.RUSAGE_SELF)
+    # RUSAGE_CHILDREN keeps the largest peak of any terminated child, so it only tells about this stage if it grew
+    children_peak = max_rss_bytes(resource.RUSAGE_CHILDREN)
+
+    results[stage] = {
+        "records": records,
+        "wall_time_s": round(wall_time, 4),
+        "throughput_per_s": round(records / wall_time, 1) if wall_time > 0 else None,
+        "peak_rss_bytes": peak_memory,
+        # Without a reset the peak is the process's high-water mark so far, not this stage's
+        "peak_rss_is_stage_peak": peak_reset,
+        "worker_peak_rss_bytes": children_peak if children_peak > children_before else None,
+    }
+    workers = f", largest worker {children_peak / 2**20:.1f} MiB" if children_peak > children_before else ""
+    print(f"{stage}: {records} records in {wall_time:.2f}s, peak RSS {peak_memory / 2**20:.1f} MiB{workers}")
+
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+def seed_userbeh(db, generate_events, event_count, site_url):
+    """
+    Loads synthetic events into userbeh with every URL pointed at the local product page server.
+    """
+
+    from bson import json_util
+
+    site = urllib.parse.urlsplit(site_url)
+    collection = db["userbeh"]
+    batch = []
+    for event in generate_events(event_count):
+        url = urllib.parse.urlsplit(event["current_url"])
+        event["current_url"] = url._replace(scheme=site.scheme, netloc=site.netloc).geturl()
+        batch.append(json_util.loads(json.dumps(event)))
+        if len(batch) >= SEED_BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="glamira_bench_")
+    write_configs(workdir, args.mongodb_uri or "mongodb://stand-in", args.batch_size)
+    os.chdir(workdir)
+
+    import pymongo
+    if args.mongodb_uri is None:
+        pymongo.MongoClient = local_stand_ins.mongomock_client_factory()
+    if args.ip2location_db is None:
+        sys.modules["IP2Location"] = local_stand_ins.ip2location_module
+
+    # Scripts read their configs at import time, so they are imported from inside workdir
+    generate_events = importlib.import_module("py_scripts_generate_events").generate_events
+    ip_locations = importlib.import_module("py_scripts_process_ip_locations")
+    crawler = importlib.import_module("py_scripts_product_details_crawling")
+    export_ip_locations = importlib.import_module("py_scripts_export_user_ip_locations")
+    export_product_details = importlib.import_module("py_scripts_export_product_details")
+    raw_data_transform = importlib.import_module("raw_data_transform")
+    dead_letter = importlib.import_module("dead_letter")
+
+    storage_client = local_stand_ins.FilesystemStorageClient(os.path.join(workdir, "gcs"))
+    for exporter in (export_ip_locations, export_product_details):
+        exporter.storage = types.SimpleNamespace(Client=lambda: storage_client)
+
+    client = pymongo.MongoClient(args.mongodb_uri)
+    client.drop_database(BENCH_DB)
+    db = client[BENCH_DB]
+    results = {}
+
+    with local_stand_ins.ProductPageServer() as server:
+        seed_start = time.perf_counter()
+        seed_userbeh(db, generate_events, args.events, server.url)
+        print(f"Seeded {args.events} events in {time.perf_counter() - seed_start:.2f}s")
+
+        def run_ip_locations():
+            ip_locations.process_ip_locations(args.mongodb_uri, BENCH_DB, "userbeh", "user_ip_locations",
+                                              args.ip2location_db or "IP2LOCATION-STAND-IN.BIN")
+            return db["user_ip_locations"].count_documents({})
+
+        def run_crawler():
+            crawler.crawl_product_details(args.mongodb_uri, BENCH_DB, "userbeh", "product_details")
+            return db["product_details"].count_documents({})
+
+        measure(results, "process_ip_locations", run_ip_locations)
+        measure(results, "crawl_product_details", run_crawler)
+
+    def run_exporter(exporter):
+        output_blob_name = exporter.export_to_gcs()
+        return count_lines(os.path.join(workdir, "gcs", BENCH_BUCKET, output_blob_name))
+
+    measure(results, "export_user_ip_locations", lambda: run_exporter(export_ip_locations))
+    measure(results, "export_product_details", lambda: run_exporter(export_product_details))
+
+    # The loader function receives mongoexport output: canonical extended JSON, one event per line
+    events_path = os.path.join(workdir, "raw_events.jsonl")
+    importlib.import_module("py_scripts_generate_events").write_jsonl(events_path, args.events)
+
+    def run_transform():
+        sink = local_stand_ins.InMemoryRowSink()
+        buffer = []
+        with open(events_path, encoding='utf-8') as f:
+            for line in f:
+                buffer.append(json.loads(line))
+                if len(buffer) >= TRANSFORM_CHUNK_SIZE:
+                    dead_letter.insert_rows_with_retry(sink, None, raw_data_transform.process_data_chunk(buffer))
+                    buffer = []
+        if buffer:
+            dead_letter.insert_rows_with_retry(sink, None, raw_data_transform.process_data_chunk(buffer))
+        return sink.row_count
+
+    measure(results, "process_data_chunk", run_transform)
+    client.close()
+
+    return {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "events": args.events,
+        "mongodb": "local" if args.mongodb_uri else "mongomock",
+        "ip2location": "bin" if args.ip2location_db else "stand-in",
+        "python": platform.python_version(),
+        "stages": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages against local stand-ins.")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--mongodb-uri", help="local mongod to use instead of mongomock")
+    parser.add_argument("--ip2location-db", help="IP2Location BIN file to use instead of the stand-in reader")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    # The Cloud Functions ship copies of the shared modules; refuse to measure code they would not deploy
+    if importlib.import_module("py_scripts_sync_function_modules").sync_function_modules(check=True):
+        sys.exit(1)
+
+    output_path = os.path.abspath(args.output)
+    report = run_benchmark(args)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output_path}")
@@ -0,0 +1,94 @@
+{#
+    Generic tests scoped to the most recent partitions of a date-partitioned model, so checks on
+    incremental tables only scan what the last runs built. The latest partition is read from
+    INFORMATION_SCHEMA.PARTITIONS (metadata, no table scan) and inlined as a constant, which
+    BigQuery can prune on. Run with `--vars '{full_test_scan: true}'` to check the whole table.
+#}
+{% macro recent_partition_filter(model, partition_column, lookback_days=none) %}
+{% set lookback_days = lookback_days if lookback_days is not none else var('test_lookback_days') %}
+{% if execute and not var('full_test_scan') %}
+    {% set latest_partition_query %}
+        SELECT MAX(PARSE_DATE('%Y%m%d', partition_id))
+        FROM `{{ model.database }}.{{ model.schema }}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name = '{{ model.identifier }}'
+          AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+    {% endset %}
+    {% set latest_partition = run_query(latest_partition_query).columns[0].values()[0] %}
+    {% if latest_partition is not none %}
+WHERE {{ partition_column }} >= DATE_SUB(DATE '{{ latest_partition }}', INTERVAL {{ lookback_days }} DAY)
+    {% endif %}
+{% endif %}
+{% endmacro %}
+
+
+{% test not_null_in_recent_partitions(model, column_name, partition_column, lookback_days=none) %}
+WITH recent AS (
+    SELECT {{ column_name }}
+    FROM {{ model }}
+    {{ recent_partition_filter(model, partition_column, lookback_days) }}
+)
+SELECT *
+FROM recent
+WHERE {{ column_name }} IS NULL
+{% endtest %}
+
+
+{% test unique_in_recent_partitions(model, column_name, partition_column, lookback_days=none) %}
+WITH recent AS (
+    SELECT {{ column_name }}
+    FROM {{ model }}
+    {{ recent_partition_filter(model, partition_column, lookback_days) }}
+)
+SELECT {{ column_name }}, COUNT(*) AS n_records
+FROM recent
+WHERE {{ column_name }} IS NOT NULL
+GROUP BY {{ column_name }}
+HAVING COUNT(*) > 1
+{% endtest %}
+
+
+{% test unique_combination_in_recent_partitions(model, combination_of_columns, partition_column, lookback_days=none) %}
+{% set columns = combination_of_columns | join(', ') %}
+WITH recent AS (
+    SELECT {{ columns }}
+    FROM {{ model }}
+    {{ recent_partition_filter(model, partition_column, lookback_days) }}
+)
+SELECT {{ columns }}, COUNT(*) AS n_records
+FROM recent
+GROUP BY {{ columns }}
+HAVING COUNT(*) > 1
+{% endtest %}
+
+
+{#
+    Anomaly check on a daily summary-statistics table: fails the recent days whose value is more than
+    `max_zscore` standard deviations from the trailing `baseline_days` before it, or above `max_value`.
+    The statistics table holds one row per day, so the baseline never touches the source history.
+#}
+{% test daily_stat_in_range(model, column_name, date_column='date_key', lookback_days=none, baseline_days=28, max_zscore=3, max_value=none) %}
+{% set lookback_days = lookback_days if lookback_days is not none else var('test_lookback_days') %}
+WITH daily AS (
+    SELECT
+        {{ date_column }} AS stat_date,
+        {{ column_name }} AS stat_value,
+        AVG({{ column_name }}) OVER baseline AS baseline_mean,
+        STDDEV({{ column_name }}) OVER baseline AS baseline_stddev,
+        COUNT({{ column_name }}) OVER baseline AS baseline_count
+    FROM {{ model }}
+    WINDOW baseline AS (
+        ORDER BY UNIX_DATE({{ date_column }})
+        RANGE BETWEEN {{ baseline_days }} PRECEDING AND 1 PRECEDING
+    )
+)
+SELECT *
+FROM daily
+WHERE stat_date >= (SELECT DATE_SUB(MAX({{ date_column }}), INTERVAL {{ lookback_days }} DAY) FROM {{ model }})
+  AND (
+      (baseline_count >= 7 AND baseline_stddev > 0
+          AND ABS(stat_value - baseline_mean) > {{ max_zscore }} * baseline_stddev)
+      {% if max_value is not none %}
+      OR stat_value > {{ max_value }}
+      {% endif %}
+  )
+{% endtest %}
@@ -0,0 +1,10 @@
+{#
+    Restricts a reporting rollup to the most recent fact_sales partitions on incremental runs.
+    `_dbt_max_partition` is declared by the BigQuery insert_overwrite strategy and holds the
+    latest date_key already present in the rollup, so only the lookback window is rescanned.
+#}
+{% macro rollup_lookback_filter(date_column) %}
+{% if is_incremental() %}
+WHERE {{ date_column }} >= DATE_SUB(_dbt_max_partition, INTERVAL {{ var('rollup_lookback_days') }} DAY)
+{% endif %}
+{% endmacro %}
@@ -1,14 +1,17 @@
 {{ config(
     tags=["fact"],
     materialized='incremental',
-    strategy='append'
+    strategy='append',
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'}
 ) }}
 
 SELECT
     o.order_id,
+    cp.cart_line,
     CAST(cp.product_id AS STRING) as product_id,
     d.date_key,
     g.ip_address,
+    o.store_id,
     cp.USD_price,
     cp.amount AS quantity,
     cp.original_currency,
@@ -0,0 +1,61 @@
+{{ config(
+    tags=["monitoring"],
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'}
+) }}
+
+-- One row per day of fact_sales, rebuilt for the lookback window only; anomaly tests read this table
+-- instead of rescanning fact_sales history
+WITH recent_sales AS (
+    SELECT
+        fs.order_id,
+        fs.cart_line,
+        fs.product_id,
+        fs.date_key,
+        fs.ip_address,
+        fs.USD_price,
+        fs.quantity,
+        fs.product_option_id
+    FROM {{ ref('fact_sales') }} AS fs
+    {{ rollup_lookback_filter('fs.date_key') }}
+),
+row_stats AS (
+    SELECT
+        date_key,
+        COUNT(*) AS row_count,
+        COUNT(DISTINCT order_id) AS order_count,
+        SAFE_DIVIDE(COUNTIF(ip_address IS NULL), COUNT(*)) AS ip_address_null_rate,
+        SAFE_DIVIDE(COUNTIF(product_option_id IS NULL), COUNT(*)) AS product_option_id_null_rate,
+        SAFE_DIVIDE(COUNTIF(USD_price IS NULL), COUNT(*)) AS usd_price_null_rate
+    FROM recent_sales
+    GROUP BY date_key
+),
+-- fact_sales holds one row per order line and option, so lines are de-duplicated on
+-- (order_id, cart_line) before summing revenue
+order_lines AS (
+    SELECT DISTINCT
+        order_id,
+        cart_line,
+        product_id,
+        date_key,
+        USD_price,
+        quantity
+    FROM recent_sales
+),
+revenue AS (
+    SELECT
+        date_key,
+        ROUND(SUM(USD_price * quantity), 3) AS revenue_usd
+    FROM order_lines
+    GROUP BY date_key
+)
+SELECT
+    rs.date_key,
+    rs.row_count,
+    rs.order_count,
+    rs.ip_address_null_rate,
+    rs.product_option_id_null_rate,
+    rs.usd_price_null_rate,
+    r.revenue_usd,
+    CURRENT_TIMESTAMP() AS computed_at
+FROM row_stats AS rs
+LEFT JOIN revenue AS r ON rs.date_key = r.date_key
@@ -0,0 +1,30 @@
+{{ config(
+    tags=["rollup"],
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['country_name']
+) }}
+
+-- fact_sales holds one row per order line and option, so lines are de-duplicated on
+-- (order_id, cart_line) before summing revenue
+WITH order_lines AS (
+    SELECT DISTINCT
+        fs.order_id,
+        fs.cart_line,
+        fs.product_id,
+        fs.date_key,
+        fs.ip_address,
+        fs.USD_price,
+        fs.quantity
+    FROM {{ ref('fact_sales') }} AS fs
+    {{ rollup_lookback_filter('fs.date_key') }}
+)
+SELECT
+    ol.date_key,
+    COALESCE(dg.country_code, 'N/A') AS country_code,
+    COALESCE(dg.country_name, 'N/A') AS country_name,
+    COUNT(DISTINCT ol.order_id) AS order_count,
+    SUM(ol.quantity) AS quantity,
+    ROUND(SUM(ol.USD_price * ol.quantity), 3) AS revenue_usd
+FROM order_lines AS ol
+LEFT JOIN {{ source('glamira_data', 'dim_geo') }} AS dg ON ol.ip_address = dg.ip_address
+GROUP BY 1, 2, 3
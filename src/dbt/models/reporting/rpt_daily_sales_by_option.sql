@@ -0,0 +1,19 @@
+{{ config(
+    tags=["rollup"],
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['option_label', 'value_label']
+) }}
+
+-- Every fact_sales row is an (order line, option) pair, so rows are summed as-is per option
+SELECT
+    fs.date_key,
+    fs.product_option_id,
+    COALESCE(dpo.option_label, 'N/A') AS option_label,
+    COALESCE(dpo.value_label, 'N/A') AS value_label,
+    COUNT(DISTINCT fs.order_id) AS order_count,
+    SUM(fs.quantity) AS quantity,
+    ROUND(SUM(fs.USD_price * fs.quantity), 3) AS revenue_usd
+FROM {{ ref('fact_sales') }} AS fs
+LEFT JOIN {{ source('glamira_data', 'dim_product_option') }} AS dpo ON fs.product_option_id = dpo.product_option_id
+{{ rollup_lookback_filter('fs.date_key') }}
+GROUP BY 1, 2, 3, 4
@@ -0,0 +1,36 @@
+{{ config(
+    tags=["rollup"],
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['product_id']
+) }}
+
+-- fact_sales holds one row per order line and option, so lines are de-duplicated on
+-- (order_id, cart_line) before summing revenue
+WITH order_lines AS (
+    SELECT DISTINCT
+        fs.order_id,
+        fs.cart_line,
+        fs.product_id,
+        fs.date_key,
+        fs.USD_price,
+        fs.quantity
+    FROM {{ ref('fact_sales') }} AS fs
+    {{ rollup_lookback_filter('fs.date_key') }}
+),
+product_names AS (
+    SELECT
+        CAST(dp.product_id AS STRING) AS product_id,
+        ANY_VALUE(dp.product_name) AS product_name
+    FROM {{ source('glamira_data', 'dim_product') }} AS dp
+    GROUP BY 1
+)
+SELECT
+    ol.date_key,
+    ol.product_id,
+    COALESCE(pn.product_name, 'N/A') AS product_name,
+    COUNT(DISTINCT ol.order_id) AS order_count,
+    SUM(ol.quantity) AS quantity,
+    ROUND(SUM(ol.USD_price * ol.quantity), 3) AS revenue_usd
+FROM order_lines AS ol
+LEFT JOIN product_names AS pn ON ol.product_id = pn.product_id
+GROUP BY 1, 2, 3
@@ -0,0 +1,30 @@
+{{ config(
+    tags=["rollup"],
+    partition_by={'field': 'date_key', 'data_type': 'date', 'granularity': 'day'},
+    cluster_by=['store_id', 'original_currency']
+) }}
+
+-- fact_sales holds one row per order line and option, so lines are de-duplicated on
+-- (order_id, cart_line) before summing revenue
+WITH order_lines AS (
+    SELECT DISTINCT
+        fs.order_id,
+        fs.cart_line,
+        fs.product_id,
+        fs.date_key,
+        fs.store_id,
+        fs.USD_price,
+        fs.quantity,
+        fs.original_currency
+    FROM {{ ref('fact_sales') }} AS fs
+    {{ rollup_lookback_filter('fs.date_key') }}
+)
+SELECT
+    ol.date_key,
+    COALESCE(ol.store_id, 'N/A') AS store_id,
+    ol.original_currency,
+    COUNT(DISTINCT ol.order_id) AS order_count,
+    SUM(ol.quantity) AS quantity,
+    ROUND(SUM(ol.USD_price * ol.quantity), 3) AS revenue_usd
+FROM order_lines AS ol
+GROUP BY 1, 2, 3
@@ -5,6 +5,7 @@
 SELECT
     re.record_id,
     re.order_id,
+    re.cart_line,
     re.product_id,
     re.amount,
     re.USD_price,
@@ -14,6 +15,8 @@ FROM (
     SELECT
         t1.record_id,
         t1.order_id,
+        -- Position of the line in the cart; identical lines of one order stay apart
+        cart_line,
         cp.product_id,
         cp.amount,
         ROUND( 
@@ -42,7 +45,7 @@ FROM (
         ) AS option
     FROM
         {{ source('glamira_data', 'stg_checkout_source') }} AS t1,
-        UNNEST(t1.cart_products) AS cp
+        UNNEST(t1.cart_products) AS cp WITH OFFSET AS cart_line
         LEFT JOIN {{ source('glamira_data', 'exchange_rates') }} AS er ON TRIM(cp.currency) = er.original_currency_representation
     WHERE event_collection = 'checkout_success'
         AND cp.currency IS NOT NULL
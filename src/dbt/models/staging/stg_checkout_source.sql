@@ -38,8 +38,10 @@ SELECT
             ELSE cp.option
         END AS option
         )
+        -- Keep the event's cart order, so a line's offset in cart_products is stable across runs
+        ORDER BY cart_line
     ) AS cart_products,
 FROM RankedEvents re,
-    UNNEST(re.cart_products) AS cp
+    UNNEST(re.cart_products) AS cp WITH OFFSET AS cart_line
 WHERE rn = 1
 GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16
\ No newline at end of file
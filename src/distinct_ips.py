@@ -0,0 +1,208 @@
+"""
+Client-side distinct IP extraction for userbeh.
+
+Instead of a server-side `$group` on `ip` (which spills to disk on large
+collections), the `ip` field is streamed through projected cursors over parallel
+`_id` ranges and packed into integer arrays: IPv4 as 32-bit integers, IPv6 as
+(high, low) 64-bit pairs. Duplicates are removed while streaming, every CHUNK_SIZE
+addresses: with sort/unique merged into a running result, or for IPv4 by setting
+bits of a shared 2^32-bit bitmap. The unique IPs come out in numeric order so the
+IP2Location range lookups that follow hit neighbouring rows of the BIN file.
+"""
+import datetime
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from bson import ObjectId
+
+IPV6_DTYPE = np.dtype([("high", np.uint64), ("low", np.uint64)])
+IPV4_BITMAP_BYTES = 1 << 29
+CURSOR_BATCH_SIZE = 10000
+# Addresses buffered per range before they are deduplicated
+CHUNK_SIZE = 1 << 20
+
+
+def object_id_ranges(collection, parts):
+    """
+    Splits the collection into `parts` contiguous `_id` ranges by ObjectId creation time.
+    The first and last ranges are open-ended so documents are never missed.
+    """
+
+    first = collection.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+    last = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if first is None:
+        return []
+    if parts <= 1 or not isinstance(first["_id"], ObjectId) or not isinstance(last["_id"], ObjectId):
+        return [(None, None)]
+
+    start = first["_id"].generation_time.timestamp()
+    end = last["_id"].generation_time.timestamp()
+    step = (end - start) / parts
+    boundaries = sorted({
+        ObjectId.from_datetime(datetime.datetime.fromtimestamp(start + i * step, datetime.timezone.utc))
+        for i in range(1, parts)
+    })
+    bounds = [None] + boundaries + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def range_query(id_range):
+    lower, upper = id_range
+    query = {}
+    if lower is not None:
+        query["$gte"] = lower
+    if upper is not None:
+        query["$lt"] = upper
+    return {"_id": query} if query else {}
+
+
+def unpack(buffer, dtype):
+    """
+    Views packed big-endian addresses as native integers, byte-swapping the buffer in place instead of copying it.
+    """
+
+    values = np.frombuffer(buffer, dtype=dtype)
+    if not values.dtype.isnative:
+        values = values.byteswap(inplace=True).view(values.dtype.newbyteorder())
+    return values
+
+
+class UniqueMerger:
+    """
+    Keeps the sorted unique values of the chunks added so far. Chunks are reduced on arrival and
+    merged into the result once they outgrow it, so memory stays near the distinct count.
+    """
+
+    def __init__(self, dtype):
+        self.merged = np.empty(0, dtype=dtype)
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, values):
+        unique = np.unique(values)
+        self.pending.append(unique)
+        self.pending_size += len(unique)
+        if self.pending_size > max(len(self.merged), CHUNK_SIZE):
+            self.merge()
+
+    def merge(self):
+        if self.pending:
+            self.merged = np.unique(np.concatenate([self.merged] + self.pending))
+            self.pending = []
+            self.pending_size = 0
+        return self.merged
+
+
+class Ipv4Bitmap:
+    """
+    Fixed 512 MiB bitmap of IPv4 addresses shared by the range threads; cheaper than sorting past ~100M addresses.
+    """
+
+    def __init__(self):
+        self.bitmap = np.zeros(IPV4_BITMAP_BYTES, dtype=np.uint8)
+        self.lock = threading.Lock()
+
+    def add(self, values):
+        bits = np.left_shift(1, values & 7).astype(np.uint8)
+        with self.lock:
+            np.bitwise_or.at(self.bitmap, values >> 3, bits)
+
+    def values(self):
+        byte_indexes = np.flatnonzero(self.bitmap)
+        bits = np.unpackbits(self.bitmap[byte_indexes], bitorder="little").reshape(-1, 8)
+        rows, columns = np.nonzero(bits)
+        return (byte_indexes[rows].astype(np.uint32) << 3) | columns.astype(np.uint32)
+
+
+def pack_range(collection, id_range, ipv4_bitmap=None):
+    """
+    Streams the `ip` field of one `_id` range and returns (unique IPv4 array, unique IPv6 array, other IPs).
+    With `ipv4_bitmap` the IPv4 addresses are set in the bitmap instead and the IPv4 array is empty.
+    Strings that do not round-trip through inet_pton/inet_ntop are kept verbatim in `other`,
+    so every IP is looked up exactly as it is stored in userbeh.
+    """
+
+    ipv4_unique = UniqueMerger(np.uint32)
+    ipv6_unique = UniqueMerger(IPV6_DTYPE)
+    add_ipv4 = ipv4_bitmap.add if ipv4_bitmap is not None else ipv4_unique.add
+    ipv4 = bytearray()
+    ipv6 = bytearray()
+    other = set()
+    cursor = collection.find(range_query(id_range), {"ip": 1, "_id": 0}, batch_size=CURSOR_BATCH_SIZE)
+    for doc in cursor:
+        ip = doc.get("ip")
+        if not ip:
+            continue
+        try:
+            if ":" in ip:
+                packed = socket.inet_pton(socket.AF_INET6, ip)
+                if socket.inet_ntop(socket.AF_INET6, packed) != ip:
+                    raise ValueError(ip)
+                ipv6 += packed
+                if len(ipv6) >= CHUNK_SIZE * 16:
+                    # A fresh buffer each chunk: the array views keep the old one alive
+                    ipv6_unique.add(unpack(ipv6, ">u8").view(IPV6_DTYPE))
+                    ipv6 = bytearray()
+            else:
+                ipv4 += socket.inet_pton(socket.AF_INET, ip)
+                if len(ipv4) >= CHUNK_SIZE * 4:
+                    add_ipv4(unpack(ipv4, ">u4"))
+                    ipv4 = bytearray()
+        except (OSError, ValueError, TypeError):
+            other.add(ip)
+
+    if ipv4:
+        add_ipv4(unpack(ipv4, ">u4"))
+    if ipv6:
+        ipv6_unique.add(unpack(ipv6, ">u8").view(IPV6_DTYPE))
+    return ipv4_unique.merge(), ipv6_unique.merge(), other
+
+
+def extract_distinct_ips(collection, workers=4, dedupe="sort"):
+    """
+    Returns the distinct IPs of the collection as packed arrays: (IPv4 uint32, IPv6 (high, low), other strings).
+    `dedupe` is "sort" (sort/unique) or "bitmap" (IPv4 bitmap).
+    """
+
+    ipv4_bitmap = Ipv4Bitmap() if dedupe == "bitmap" else None
+    id_ranges = object_id_ranges(collection, workers)
+    with ThreadPoolExecutor(max_workers=max(len(id_ranges), 1)) as executor:
+        results = list(executor.map(lambda id_range: pack_range(collection, id_range, ipv4_bitmap), id_ranges))
+
+    if ipv4_bitmap is not None:
+        ipv4 = ipv4_bitmap.values()
+    else:
+        ipv4_unique = UniqueMerger(np.uint32)
+        for part, _, _ in results:
+            ipv4_unique.add(part)
+        ipv4 = ipv4_unique.merge()
+    ipv6_unique = UniqueMerger(IPV6_DTYPE)
+    for _, part, _ in results:
+        ipv6_unique.add(part)
+    ipv6 = ipv6_unique.merge()
+    other = set().union(*(other for _, _, other in results))
+    return ipv4, ipv6, other
+
+
+def iter_ips(ipv4, ipv6, other):
+    """
+    Yields IP strings in numeric order: IPv4, then IPv6, then unparseable values.
+    """
+
+    ipv4_bytes = ipv4.astype(">u4").tobytes()
+    for offset in range(0, len(ipv4_bytes), 4):
+        yield socket.inet_ntop(socket.AF_INET, ipv4_bytes[offset:offset + 4])
+    ipv6_bytes = ipv6.view(np.uint64).astype(">u8").tobytes()
+    for offset in range(0, len(ipv6_bytes), 16):
+        yield socket.inet_ntop(socket.AF_INET6, ipv6_bytes[offset:offset + 16])
+    yield from sorted(other)
+
+
+def distinct_ips(collection, workers=4, dedupe="sort"):
+    """
+    Yields every distinct `ip` of the collection once, in numeric order.
+    """
+
+    yield from iter_ips(*extract_distinct_ips(collection, workers, dedupe))
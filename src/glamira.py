@@ -0,0 +1,129 @@
+"""
+Single entry point for the pipeline scripts.
+
+    python src/glamira.py import data/raw/dump.txt --workers 8
+    python src/glamira.py enrich-ip --extractor packed + crawl + export
+
+Stages joined with `+` run in one process: the configs are resolved once and
+the stages share one pooled MongoClient. Each stage's script module (and its
+heavy dependencies: IP2Location, bs4, tqdm, google-cloud-storage) is imported
+only when that stage runs.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+import glamira_config
+
+EXPORT_MODULES = {
+    "ip-locations": "py_scripts_export_user_ip_locations",
+    "product-details": "py_scripts_export_product_details",
+}
+# Script modules each stage imports when it runs
+STAGE_MODULES = {
+    "import": ["py_scripts_import_raw_data"],
+    "enrich-ip": ["py_scripts_process_ip_locations"],
+    "crawl": ["py_scripts_product_details_crawling"],
+    "export": list(EXPORT_MODULES.values()),
+}
+STAGE_SEPARATOR = "+"
+
+
+def shared_client():
+    config = glamira_config.load_config()
+    return glamira_config.mongo_client(config["mongodb"]["uri"])
+
+
+def run_import(args):
+    # Importer workers are separate processes with their own connections, so no shared client here
+    importer = importlib.import_module(STAGE_MODULES["import"][0])
+    for dump_path in args.paths:
+        importer.import_raw_data(dump_path, args.workers, args.batch_size or importer.insert_batch_size)
+
+
+def run_enrich_ip(args):
+    ip_locations = importlib.import_module(STAGE_MODULES["enrich-ip"][0])
+    ip_locations.process_ip_locations(
+        ip_locations.mongodb_uri, ip_locations.db_name, ip_locations.main_collection_name,
+        ip_locations.location_collection_name, ip_locations.ip2location_db_path,
+        args.extractor, args.workers, args.dedupe, client=shared_client())
+
+
+def run_crawl(args):
+    crawler = importlib.import_module(STAGE_MODULES["crawl"][0])
+    crawler.crawl_product_details(crawler.mongodb_uri, crawler.db_name, crawler.main_collection_name,
+                                  crawler.location_collection_name, client=shared_client(),
+                                  name_cache_path=args.name_cache)
+
+
+def run_export(args):
+    for collection in args.collections or list(EXPORT_MODULES):
+        exporter = importlib.import_module(EXPORT_MODULES[collection])
+        exporter.export_to_gcs(client=shared_client())
+
+
+def export_collection(value):
+    # argparse rejects an empty nargs="*" list against choices, so the names are checked here
+    if value not in EXPORT_MODULES:
+        raise argparse.ArgumentTypeError(f"invalid choice: {value!r} (choose from {', '.join(EXPORT_MODULES)})")
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="glamira", description=f"Run pipeline stages; join stages with '{STAGE_SEPARATOR}' to chain them.")
+    parser.add_argument("--config-dir", help="directory of the *.ini files (default: config/ overridden by configs/)")
+    subparsers = parser.add_subparsers(dest="stage", required=True)
+
+    import_parser = subparsers.add_parser("import", help="bulk import raw event dumps into userbeh")
+    import_parser.add_argument("paths", nargs="+", help="dump files of concatenated {_id, collection, sample} objects")
+    import_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    import_parser.add_argument("--batch-size", type=int, help="documents per insert_many")
+    import_parser.set_defaults(run=run_import)
+
+    enrich_parser = subparsers.add_parser("enrich-ip", help="look up the location of every distinct IP")
+    enrich_parser.add_argument("--extractor", choices=["group", "packed"], default="group")
+    enrich_parser.add_argument("--workers", type=int, default=4)
+    enrich_parser.add_argument("--dedupe", choices=["sort", "bitmap"], default="sort")
+    enrich_parser.set_defaults(run=run_enrich_ip)
+
+    crawl_parser = subparsers.add_parser("crawl", help="crawl product names of viewed products")
+    crawl_parser.add_argument("--name-cache", help="SQLite product-name cache; only crawl names it cannot resolve")
+    crawl_parser.set_defaults(run=run_crawl)
+
+    export_parser = subparsers.add_parser("export", help="export enriched collections to GCS as JSONL")
+    export_parser.add_argument("collections", nargs="*", type=export_collection, metavar="collection",
+                               help=f"any of {', '.join(EXPORT_MODULES)} (default: all)")
+    export_parser.set_defaults(run=run_export)
+    return parser
+
+
+def split_stages(argv):
+    stages = [[]]
+    for arg in argv:
+        if arg == STAGE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+def main(argv=None):
+    parser = build_parser()
+    # Parse every stage up front so a typo in the last stage fails before the first one runs
+    stages = [parser.parse_args(stage_argv) for stage_argv in split_stages(sys.argv[1:] if argv is None else argv)]
+    # The configs are resolved once for the whole run, so a later stage cannot switch them
+    if any(args.config_dir is not None for args in stages[1:]):
+        parser.error(f"--config-dir applies to every stage; give it once before the first stage, not after '{STAGE_SEPARATOR}'")
+
+    glamira_config.load_config(stages[0].config_dir)
+    try:
+        for args in stages:
+            args.run(args)
+    finally:
+        glamira_config.close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Shared configuration and MongoDB client for the pipeline scripts and the glamira CLI.
+
+The ini files are read once per process with `${VAR}` (and `${VAR:-default}`)
+values resolved from the environment and `.env`. Scripts that run in the same
+process share one pooled MongoClient per URI instead of connecting per stage.
+"""
+import configparser
+import os
+import re
+
+from dotenv import load_dotenv
+
+CONFIG_FILES = [
+    "app_config.ini",
+    "mongodb_config.ini",
+    "gcs_config.ini",
+    "ip2location_config.ini",
+    "crawling_config.ini",
+]
+# Checked-in templates first, then local overrides
+CONFIG_DIRS = ["config", "configs"]
+
+ENV_REFERENCE = re.compile(r"\$\{(\w+)(?::-([^}]*))?\}")
+
+_config = None
+_mongo_clients = {}
+
+
+class EnvInterpolation(configparser.Interpolation):
+    """
+    Replaces `${VAR}` with the environment variable VAR and `${VAR:-default}` with VAR or the default.
+    A missing variable without default fails when the option is read, naming the option.
+    """
+
+    def before_get(self, parser, section, option, value, defaults):
+        def resolve(match):
+            name, default = match.group(1), match.group(2)
+            resolved = os.environ.get(name, default)
+            if resolved is None:
+                raise configparser.InterpolationError(
+                    option, section, f"environment variable {name} referenced by [{section}] {option} is not set")
+            return resolved
+
+        return ENV_REFERENCE.sub(resolve, value)
+
+
+def load_config(config_dir=None):
+    """
+    Returns the pipeline configuration, reading it on first use.
+    `config_dir` (or GLAMIRA_CONFIG_DIR) replaces the default config/ and configs/ lookup.
+    """
+
+    global _config
+    if _config is None:
+        load_dotenv()
+        config_dir = config_dir or os.environ.get("GLAMIRA_CONFIG_DIR")
+        config_dirs = [config_dir] if config_dir else CONFIG_DIRS
+        config = configparser.ConfigParser(interpolation=EnvInterpolation())
+        config.read([os.path.join(directory, name) for directory in config_dirs for name in CONFIG_FILES])
+        _config = config
+    return _config
+
+
+def mongo_client(mongodb_uri):
+    """
+    Returns the process-wide pooled MongoClient for the URI. Callers must not close it; see close_clients().
+    """
+
+    import pymongo
+
+    if mongodb_uri not in _mongo_clients:
+        _mongo_clients[mongodb_uri] = pymongo.MongoClient(mongodb_uri)
+    return _mongo_clients[mongodb_uri]
+
+
+def close_clients():
+    while _mongo_clients:
+        _, client = _mongo_clients.popitem()
+        client.close()
@@ -0,0 +1,238 @@
+"""
+Lightweight per-stage instrumentation: timers/spans, counters and histograms.
+
+Disabled unless GLAMIRA_METRICS is set, in which case every call is a dictionary
+update and `flush(stage)` prints one structured JSON line per stage (parsed as
+jsonPayload by Cloud Logging). Optional exports:
+- GLAMIRA_METRICS_PROMETHEUS_FILE: path of a Prometheus text file written on flush
+  (node_exporter textfile collector format); a `{stage}` placeholder gives each stage its own file.
+- GLAMIRA_METRICS_OTEL=1: mirror every counter/histogram to the OpenTelemetry
+  metrics API, if `opentelemetry-api` is installed and an SDK is configured.
+
+This file is copied into each directory under src/py_cloud_functions so the
+functions can be deployed on their own; edit it here and run
+py_scripts_sync_function_modules.py to update the copies.
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds or units) of the histogram buckets exported to Prometheus
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+enabled = os.getenv("GLAMIRA_METRICS", "").lower() not in ("", "0", "false")
+prometheus_file = os.getenv("GLAMIRA_METRICS_PROMETHEUS_FILE")
+otel_enabled = os.getenv("GLAMIRA_METRICS_OTEL", "").lower() not in ("", "0", "false")
+
+counters = {}
+histograms = {}
+otel_instruments = {}
+
+
+class Histogram:
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def to_dict(self):
+        return {"count": self.count, "sum": round(self.total, 6), "min": round(self.minimum, 6),
+                "max": round(self.maximum, 6), "avg": round(self.total / self.count, 6)}
+
+
+def configure(enable=True, prometheus_path=None, otel=False):
+    """
+    Overrides the environment configuration, e.g. from a CLI flag.
+    """
+
+    global enabled, prometheus_file, otel_enabled
+    enabled = enable
+    prometheus_file = prometheus_path
+    otel_enabled = otel
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def _otel(kind, name):
+    instrument = otel_instruments.get(name)
+    if instrument is None:
+        try:
+            from opentelemetry import metrics as otel_metrics
+        except ImportError:
+            return None
+        meter = otel_metrics.get_meter("glamira")
+        instrument = meter.create_counter(name) if kind == "counter" else meter.create_histogram(name)
+        otel_instruments[name] = instrument
+    return instrument
+
+
+def count(name, value=1, **labels):
+    """
+    Adds value to a counter, e.g. rows, bytes, retries or errors.
+    """
+
+    if not enabled:
+        return
+    key = _key(name, labels)
+    counters[key] = counters.get(key, 0) + value
+    if otel_enabled and (instrument := _otel("counter", name)) is not None:
+        instrument.add(value, labels)
+
+
+def observe(name, value, **labels):
+    """
+    Records one value in a histogram.
+    """
+
+    if not enabled:
+        return
+    key = _key(name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = Histogram()
+    histogram.observe(value)
+    if otel_enabled and (instrument := _otel("histogram", name)) is not None:
+        instrument.record(value, labels)
+
+
+@contextmanager
+def _timed_span(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count(f"{name}_errors", **labels)
+        raise
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - start, **labels)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name, **labels):
+    """
+    Times a block into the `<name>_seconds` histogram and counts exceptions in `<name>_errors`.
+    """
+
+    if not enabled:
+        return _null_span
+    return _timed_span(name, labels)
+
+
+def timed_iter(name, iterable, **labels):
+    """
+    Wraps an iterator (e.g. a Mongo cursor) so the time spent fetching each item is
+    accumulated into the `<name>_seconds` histogram as a single observation.
+    """
+
+    if not enabled:
+        return iterable
+    return _timed_iter(name, iterable, labels)
+
+
+def _timed_iter(name, iterable, labels):
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        observe(f"{name}_seconds", elapsed, **labels)
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def _write_prometheus(stage, path):
+    lines = []
+    # Sorting keeps each family's samples together, under one TYPE line
+    family = None
+    for (name, labels), value in sorted(counters.items()):
+        if name != family:
+            family = name
+            lines.append(f"# TYPE glamira_{name}_total counter")
+        lines.append(f"glamira_{name}_total{_label_text((('stage', stage),) + labels)} {value}")
+    family = None
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name != family:
+            family = name
+            lines.append(f"# TYPE glamira_{name} histogram")
+        base = (("stage", stage),) + labels
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, histogram.buckets):
+            cumulative += bucket_count
+            lines.append(f"glamira_{name}_bucket{_label_text(base, (('le', bound),))} {cumulative}")
+        lines.append(f"glamira_{name}_bucket{_label_text(base, (('le', '+Inf'),))} {histogram.count}")
+        lines.append(f"glamira_{name}_sum{_label_text(base)} {histogram.total}")
+        lines.append(f"glamira_{name}_count{_label_text(base)} {histogram.count}")
+
+    # Write then rename so the textfile collector never reads a partial file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temporary_path, path)
+
+
+def flush(stage, **fields):
+    """
+    Emits everything recorded since the last flush as one JSON log line for `stage`, then resets.
+    """
+
+    if not enabled:
+        return
+    record = {
+        "severity": "INFO",
+        "message": f"metrics {stage}",
+        "stage": stage,
+        **fields,
+        "counters": {_metric_name(key): value for key, value in counters.items()},
+        "histograms": {_metric_name(key): histogram.to_dict() for key, histogram in histograms.items()},
+    }
+    print(json.dumps(record, default=str), file=sys.stdout, flush=True)
+    if prometheus_file:
+        _write_prometheus(stage, prometheus_file.format(stage=stage))
+    counters.clear()
+    histograms.clear()
+
+
+def _metric_name(key):
+    name, labels = key
+    return name + _label_text(labels)
@@ -0,0 +1,152 @@
+"""
+Indexes required by the pipeline's MongoDB queries, the queries themselves, and
+explain()-based checks that each query still gets the plan it was indexed for.
+"""
+from pymongo import ASCENDING, IndexModel
+
+ENRICHED_COLLECTIONS = ["view_product_detail", "select_product_option", "select_product_option_quality"]
+
+# Distinct product URLs crawled by py_scripts_product_details_crawling
+PRODUCT_URLS_PIPELINE = [
+    {"$match": {"collection": {"$in": ENRICHED_COLLECTIONS}}},
+    {"$group": {"_id": "$product_id", "current_url": {"$first": "$current_url"}}},
+    {"$project": {"_id": 0, "product_id": "$_id", "current_url": 1}}
+]
+
+# Per product, one product page (.html) URL and the first URL seen, for product-name resolution from
+# URL slugs before crawling. Two URLs per group keeps the $group bounded however often a product was viewed.
+PRODUCT_URL_CANDIDATES_PIPELINE = [
+    {"$match": {"collection": {"$in": ENRICHED_COLLECTIONS}}},
+    {"$group": {
+        "_id": "$product_id",
+        # $max ignores the nulls of non-product pages
+        "product_url": {"$max": {"$cond": [
+            {"$regexMatch": {"input": {"$ifNull": ["$current_url", ""]}, "regex": r"\.html([?#]|$)"}},
+            "$current_url", None]}},
+        "current_url": {"$first": "$current_url"},
+    }}
+]
+
+# Distinct IPs looked up by py_scripts_process_ip_locations; the $sort lets the ip index drive the $group
+DISTINCT_IPS_PIPELINE = [
+    {"$sort": {"ip": 1}},
+    {"$group": {"_id": "$ip"}},
+    {"$project": {"ip": "$_id", "_id": 0}}
+]
+
+INDEXES = {
+    "userbeh": [
+        # Covers PRODUCT_URLS_PIPELINE and PRODUCT_URL_CANDIDATES_PIPELINE: $match on collection, then product_id and current_url from the index
+        IndexModel([("collection", ASCENDING), ("product_id", ASCENDING), ("current_url", ASCENDING)],
+                   name="collection_product_id_current_url"),
+        IndexModel([("ip", ASCENDING)], name="ip"),
+    ],
+    "user_ip_locations": [
+        IndexModel([("ipAddress", ASCENDING)], name="ipAddress"),
+    ],
+    "product_details": [
+        # The crawler checks find_one({"product_id": ...}) before every insert
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+}
+
+# (name, collection, aggregation pipeline or find filter, whether the plan must be covered)
+PLAN_CHECKS = [
+    ("product_urls", "userbeh", PRODUCT_URLS_PIPELINE, True),
+    ("product_url_candidates", "userbeh", PRODUCT_URL_CANDIDATES_PIPELINE, True),
+    ("distinct_ips", "userbeh", DISTINCT_IPS_PIPELINE, True),
+    ("product_details_lookup", "product_details", {"product_id": "0"}, False),
+    ("ip_location_lookup", "user_ip_locations", {"ipAddress": "0.0.0.0"}, False),
+]
+
+
+def _key_pattern(keys):
+    # Servers report directions as int or float depending on how the index was created
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in keys)
+
+
+def ensure_indexes(db):
+    """
+    Creates every declared index that does not exist yet. Safe to run repeatedly.
+    An index with the same keys under another name (e.g. the default `ip_1`) counts as existing;
+    a declared name that exists with different keys raises ValueError.
+    Returns the names of the indexes created by this call.
+    """
+
+    created = []
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+        existing_patterns = {_key_pattern(info["key"]) for info in existing.values()}
+        missing = []
+        for index in indexes:
+            name = index.document["name"]
+            pattern = _key_pattern(index.document["key"].items())
+            if name in existing:
+                if _key_pattern(existing[name]["key"]) != pattern:
+                    raise ValueError(f"Index {collection_name}.{name} exists with keys {existing[name]['key']}, "
+                                     f"expected {list(pattern)}")
+            elif pattern not in existing_patterns:
+                missing.append(index)
+        if missing:
+            collection.create_indexes(missing)
+            created.extend(f"{collection_name}.{index.document['name']}" for index in missing)
+    return created
+
+
+def _plan_stages(node, stages):
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        for value in node.values():
+            _plan_stages(value, stages)
+    elif isinstance(node, list):
+        for value in node:
+            _plan_stages(value, stages)
+    return stages
+
+
+def _winning_plans(node, plans):
+    # Aggregation explain output nests the plan differently across server versions and pushdowns
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan":
+                plans.append(value)
+            else:
+                _winning_plans(value, plans)
+    elif isinstance(node, list):
+        for value in node:
+            _winning_plans(value, plans)
+    return plans
+
+
+def explain(db, collection_name, query):
+    """
+    Returns the winning plan stage names of an aggregation pipeline (list) or find filter (dict).
+    """
+
+    if isinstance(query, list):
+        output = db.command("aggregate", collection_name, pipeline=query, explain=True)
+    else:
+        output = db[collection_name].find(query).explain()
+    return _plan_stages(_winning_plans(output, []), [])
+
+
+def check_plans(db):
+    """
+    Explains every PLAN_CHECKS query and flags regressions to a collection scan,
+    or to a FETCH for queries that must be covered by their index.
+    Returns a list of {name, stages, ok, problem} results.
+    """
+
+    results = []
+    for name, collection_name, query, covered in PLAN_CHECKS:
+        stages = explain(db, collection_name, query)
+        problem = None
+        if "COLLSCAN" in stages:
+            problem = "collection scan"
+        elif covered and "FETCH" in stages:
+            problem = "not covered by index"
+        results.append({"name": name, "stages": stages, "ok": problem is None, "problem": problem})
+    return results
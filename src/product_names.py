@@ -0,0 +1,171 @@
+"""
+Product-name resolution in front of the product page crawler.
+
+Names are looked up in a persistent SQLite cache (product_id -> name, url, source,
+fetched_at) and, on a miss, in data we already have: earlier crawls in the
+product_details collection (any glamira.* store domain) and the slug of a product
+page URL seen in the events (`glamira-ring-brianna.html` -> `GLAMIRA Ring Brianna`).
+Products none of these resolve are queued for an HTTP fetch, and so are cache entries
+older than max_age_days, which are kept until the fetch replaces them.
+"""
+import re
+import sqlite3
+import time
+import urllib.parse
+from collections import Counter
+
+DEFAULT_MAX_AGE_DAYS = 30
+MISSING_NAME = "N/A"
+SKU_TOKEN = re.compile(r"^sku[a-z]?\d+$")
+
+# Resolution sources, cheapest first
+CACHE = "cache"
+PREVIOUS_CRAWL = "previous_crawl"
+SLUG = "slug"
+HTTP = "http"
+
+
+class ProductNameCache:
+    """
+    SQLite key-value store of resolved product names, one row per product_id.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS product_names ("
+            "product_id TEXT PRIMARY KEY, name TEXT NOT NULL, url TEXT, source TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+
+    def get_many(self, product_ids):
+        entries = {}
+        product_ids = list(product_ids)
+        # Stay below SQLite's bound parameter limit
+        for start in range(0, len(product_ids), 900):
+            chunk = product_ids[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT product_id, name, url, source, fetched_at FROM product_names WHERE product_id IN ({placeholders})",
+                chunk)
+            for product_id, name, url, source, fetched_at in rows:
+                entries[product_id] = {"name": name, "url": url, "source": source, "fetched_at": fetched_at}
+        return entries
+
+    def put_many(self, entries):
+        """
+        Stores (product_id, name, url, source) tuples stamped with the current time.
+        """
+
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO product_names (product_id, name, url, source, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                [(str(product_id), name, url, source, now) for product_id, name, url, source in entries])
+
+    def close(self):
+        self.connection.close()
+
+
+def product_page_slug(url):
+    """
+    Returns the `.html` page slug of a glamira.* product URL, or None for carts, categories and other pages.
+    """
+
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except (TypeError, ValueError):
+        return None
+    if not parts.hostname or "glamira." not in parts.hostname:
+        return None
+    page = parts.path.rstrip("/").rsplit("/", 1)[-1]
+    if not page.endswith(".html"):
+        return None
+    return page[:-len(".html")]
+
+
+def name_from_slug(url, product_id=None):
+    """
+    Derives a product name from the page slug: `glamira-diamonds-ohrstecker-louisa-skug100735`
+    becomes `GLAMIRA Diamonds Ohrstecker Louisa`. Trailing SKU and product id tokens are dropped.
+    """
+
+    slug = product_page_slug(url)
+    if not slug:
+        return None
+    words = [word for word in slug.split("-") if word]
+    while words and (words[-1].isdigit() or words[-1] == str(product_id) or SKU_TOKEN.match(words[-1])):
+        words.pop()
+    if len(words) < 2:
+        return None
+    return " ".join("GLAMIRA" if word == "glamira" else word.capitalize() for word in words)
+
+
+def best_url(urls):
+    # Prefer a product page over carts and category pages for the HTTP fetch
+    urls = [url for url in urls if url]
+    product_pages = [url for url in urls if product_page_slug(url)]
+    return (product_pages or urls or [None])[0]
+
+
+def resolve_product_names(candidates, cache, previous_crawls, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """
+    Resolves {product_id: [current_url, ...]} from the cache, previous crawls ({product_id: (name, url)})
+    and URL slugs. Newly resolved names are written to the cache.
+    Returns (resolved {product_id: {product_name, url, source, name_source}}, fetch queue
+    [{product_id, current_url}], Counter of sources). name_source is where the name came from
+    originally, e.g. slug for a cache hit on a slug guess.
+    """
+
+    stale_before = time.time() - max_age_days * 86400
+    cached = cache.get_many(str(product_id) for product_id in candidates)
+    resolved = {}
+    to_fetch = []
+    stats = Counter()
+    new_entries = []
+
+    for product_id, urls in candidates.items():
+        entry = cached.get(str(product_id))
+        if entry and entry["fetched_at"] >= stale_before:
+            resolved[product_id] = {"product_name": entry["name"], "url": entry["url"], "source": CACHE,
+                                    "name_source": entry["source"]}
+            stats[CACHE] += 1
+            continue
+        if entry:
+            # Stale names go straight to the fetch queue, whatever their source
+            stats["stale"] += 1
+            to_fetch.append({"product_id": product_id, "current_url": best_url([entry["url"], *urls])})
+            stats[HTTP] += 1
+            continue
+
+        previous = previous_crawls.get(product_id)
+        if previous:
+            name, url, source = previous[0], previous[1], PREVIOUS_CRAWL
+        else:
+            url = next((url for url in urls if name_from_slug(url, product_id)), None)
+            name, source = (name_from_slug(url, product_id), SLUG) if url else (None, None)
+
+        if name:
+            resolved[product_id] = {"product_name": name, "url": url, "source": source, "name_source": source}
+            new_entries.append((product_id, name, url, source))
+            stats[source] += 1
+        else:
+            to_fetch.append({"product_id": product_id, "current_url": best_url(urls)})
+            stats[HTTP] += 1
+
+    cache.put_many(new_entries)
+    return resolved, to_fetch, stats
+
+
+def hit_rate_report(stats):
+    """
+    One-line summary of how many products were resolved without an HTTP fetch.
+    """
+
+    total = stats[CACHE] + stats[PREVIOUS_CRAWL] + stats[SLUG] + stats[HTTP]
+    if not total:
+        return "No products to resolve"
+    avoided = total - stats[HTTP]
+    shares = ", ".join(f"{source} {stats[source] / total:.1%}" for source in (CACHE, PREVIOUS_CRAWL, SLUG))
+    return (f"Resolved {avoided}/{total} product names without crawling ({avoided / total:.1%}: {shares}); "
+            f"{stats[HTTP]} HTTP fetches queued, incl. {stats['stale']} stale cache entries")
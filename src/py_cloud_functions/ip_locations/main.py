@@ -3,7 +3,8 @@ from google.cloud import bigquery
 from google.cloud import storage
 from functions_framework import cloud_event
 from google.cloud.exceptions import GoogleCloudError
-import time
+import metrics
+import dead_letter
 
 @cloud_event
 def trigger_bigquery_load(cloud_event):
@@ -53,9 +54,14 @@ def trigger_bigquery_load(cloud_event):
         # Get the blob (file) from Cloud Storage.
         blob = source_bucket.blob(file_name)
 
+        # Rows BigQuery rejects go to the dead-letter bucket with a reason code.
+        dead_letters = dead_letter.DeadLetterWriter(storage_client, "ip_locations", source_bucket_name, file_name)
+        records_read = 0
+        parsed = False
+
         try:
             print(f"Processing file: {blob.name}")
-            parser = ijson.parse(blob.open("r"))
+            parser = metrics.timed_iter("json_parse", ijson.parse(blob.open("r")))
             for prefix, event, value in parser:
                 if (prefix == 'item' and event == 'start_map'):
                     row = {}
@@ -73,53 +79,51 @@ def trigger_bigquery_load(cloud_event):
                     row['city'] = value
                 elif (prefix == 'item' and event == 'end_map'):
                     rows_to_insert.append(row)
+                    records_read += 1
                     if len(rows_to_insert) >= 1000:
-                        errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                        if errors:
-                            print(f"Errors while loading data batch from {blob.name}: {errors}")
-                            for i in range(3):
-                                time.sleep(2**(i+1)) # Exponential backoff
-                                errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                                if not errors:
-                                    break
-                            else:
-                                print(f"Failed to insert rows after multiple retries from {blob.name}: {errors}")
-                        else:
-                            inserted_count_file += len(rows_to_insert)
-                            total_inserted_records += len(rows_to_insert)
-                            print(f"Inserted {len(rows_to_insert)} records from {blob.name}. Total inserted: {total_inserted_records}")
+                        inserted = insert_batch(client, table_id, schema, rows_to_insert, records_read, dead_letters)
+                        inserted_count_file += inserted
+                        total_inserted_records += inserted
+                        print(f"Inserted {inserted} records from {blob.name}. Total inserted: {total_inserted_records}")
                         rows_to_insert = []
 
             # Insert remaining rows
             if rows_to_insert:
-                errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                if errors:
-                    print(f"Errors while loading final data batch from {blob.name}: {errors}")
-                    for i in range(3):
-                        time.sleep(2**(i+1))
-                        errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                        if not errors:
-                            break
-                    else:
-                        print(f"Failed to insert final batch after multiple retries from {blob.name}: {errors}")
-
-                else:
-                    inserted_count_file += len(rows_to_insert)
-                    total_inserted_records += len(rows_to_insert)
-                    print(f"Inserted {len(rows_to_insert)} records from {blob.name}. Total inserted: {total_inserted_records}")
+                inserted = insert_batch(client, table_id, schema, rows_to_insert, records_read, dead_letters)
+                inserted_count_file += inserted
+                total_inserted_records += inserted
+                print(f"Inserted {inserted} records from {blob.name}. Total inserted: {total_inserted_records}")
+            parsed = True
 
         except ijson.JSONError as e:
-            print(f"Error decoding JSON in {blob.name}: {e}")
+            metrics.count("errors")
+            print(f"Error decoding JSON in {blob.name} after {records_read} records: {e}")
+            # Load the records read before the error, and record where parsing stopped
+            if rows_to_insert:
+                inserted = insert_batch(client, table_id, schema, rows_to_insert, records_read, dead_letters)
+                inserted_count_file += inserted
+                total_inserted_records += inserted
+            dead_letters.reject(dead_letter.JSON_DECODE, None, e, records_read)
         except Exception as e:
+            metrics.count("errors")
             print(f"Error processing {blob.name}: {e}, type={type(e)}")
 
         print(f"Finished processing file: {blob.name}. Inserted {inserted_count_file} records.")
 
+        # Upload the rejects before moving the file, so a failed upload leaves the file in place.
+        dead_letters.close()
+
+        # A file that failed part way stays in the source bucket, so its unread records are not lost.
+        if not parsed:
+            print(f"Left {blob.name} in bucket {source_bucket_name}: only {records_read} records were read")
+            return
+
         # Move the processed file to the destination bucket.
         try:
             destination_blob = destination_bucket.blob(file_name)
-            blob_copy = source_bucket.copy_blob(blob, destination_bucket, file_name)
-            source_bucket.delete_blob(file_name)
+            with metrics.span("blob_move"):
+                blob_copy = source_bucket.copy_blob(blob, destination_bucket, file_name)
+                source_bucket.delete_blob(file_name)
             print(f"Blob {blob.name} in bucket {source_bucket_name} moved to blob {destination_blob.name} in bucket {destination_bucket_name}.")
 
         except Exception as e:
@@ -130,4 +134,31 @@ def trigger_bigquery_load(cloud_event):
     except GoogleCloudError as e:
         print(f"Google Cloud Error: {e}")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred: {e}")
+    finally:
+        metrics.flush("load_ip_locations", file=cloud_event.data.get('name'))
+
+
+def insert_batch(client, table_id, schema, rows_to_insert, records_read, dead_letters):
+    """
+    Inserts one batch with retry and dead-letters the rows BigQuery rejects. Returns the number inserted.
+    """
+
+    rejected = dead_letter.insert_rows_with_retry(client, table_id, rows_to_insert, selected_fields=schema)
+    dead_letters.reject_insert_errors(rejected, source_records(rows_to_insert, records_read))
+    return len(rows_to_insert) - len(rejected)
+
+
+def source_records(rows, records_read):
+    """
+    Pairs a batch of rows with their position in the file and maps them back to the
+    input shape (ipAddress instead of ip_address), so dead letters can be replayed as-is.
+    """
+
+    first_position = records_read - len(rows)
+    batch = []
+    for offset, row in enumerate(rows):
+        record = {key: value for key, value in row.items() if key != 'ip_address'}
+        record['ipAddress'] = row.get('ip_address')
+        batch.append((first_position + offset, record))
+    return batch
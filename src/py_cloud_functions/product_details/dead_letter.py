@@ -0,0 +1,142 @@
+"""
+Dead-letter side output for the loader functions.
+
+Records a function cannot load are buffered with a reason code and written in
+batches as JSONL objects under gs://<GLAMIRA_DEAD_LETTER_BUCKET>/<function>/,
+instead of being printed line by line. Each entry keeps the record in the shape
+the function reads it, so py_scripts_replay_dead_letters.py can feed it back once
+the transform is fixed. Also holds the BigQuery insert retry shared by the
+functions. Copied into each Cloud Function by py_scripts_sync_function_modules.py;
+edit it here, not in the copies.
+"""
+import datetime
+import json
+import os
+import time
+from collections import Counter
+
+import metrics
+
+DEAD_LETTER_BUCKET = os.environ.get("GLAMIRA_DEAD_LETTER_BUCKET", "glamira_dead_letter")
+BATCH_SIZE = 10000
+MAX_ERROR_LENGTH = 1000
+
+# Reason codes
+JSON_DECODE = "json_decode"
+NOT_OBJECT = "not_object"
+TRANSFORM = "transform"
+INSERT_INVALID = "insert_invalid"
+INSERT_FAILED = "insert_failed"
+
+
+def insert_error_reason(row_errors):
+    """
+    Maps the per-row errors of BigQuery insert_rows to a reason code. Invalid rows fail again on retry;
+    anything else (stopped, backendError, timeout) is transient.
+    """
+
+    if any(error.get("reason") == "invalid" for error in row_errors):
+        return INSERT_INVALID
+    return INSERT_FAILED
+
+
+def insert_rows_with_retry(client, table, rows_to_insert, **insert_kwargs):
+    """
+    Inserts rows into BigQuery with retry. Rows BigQuery reports as invalid are not retried; the
+    rows it stopped because of them are retried on their own, so good rows keep flowing.
+    Returns the rejected rows as insert_rows errors ({"index", "errors"}) indexed into rows_to_insert.
+    """
+
+    rejected = []
+    pending = list(range(len(rows_to_insert)))
+    for attempt in range(4):
+        if attempt:
+            time.sleep(2 ** attempt)
+            metrics.count("insert_retries")
+        with metrics.span("bigquery_insert"):
+            errors = client.insert_rows(table, [rows_to_insert[i] for i in pending], **insert_kwargs)
+        if not errors:
+            pending = []
+            break
+
+        print(f"Errors while loading data batch: {len(errors)} of {len(pending)} rows failed")
+        retry = []
+        for error in errors:
+            error = {"index": pending[error["index"]], "errors": error["errors"]}
+            if insert_error_reason(error["errors"]) == INSERT_INVALID:
+                rejected.append(error)
+            else:
+                retry.append(error)
+        # Rows missing from the errors were inserted
+        pending = [error["index"] for error in retry]
+        if not pending:
+            break
+    else:
+        print(f"Failed to insert {len(retry)} rows after multiple retries")
+        rejected.extend(retry)
+
+    metrics.count("rows", len(rows_to_insert) - len(rejected))
+    if rejected:
+        metrics.count("insert_errors", len(rejected))
+    return rejected
+
+
+class DeadLetterWriter:
+    """
+    Collects the rejected records of one source file and uploads them every BATCH_SIZE records and on close().
+    """
+
+    def __init__(self, storage_client, function_name, source_bucket, source_name):
+        self.bucket = storage_client.bucket(DEAD_LETTER_BUCKET)
+        self.function_name = function_name
+        self.source = f"gs://{source_bucket}/{source_name}"
+        self.source_name = source_name
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.entries = []
+        self.reasons = Counter()
+        self.uris = []
+
+    def reject(self, reason, record, error=None, position=None):
+        self.reasons[reason] += 1
+        metrics.count("dead_letters")
+        self.entries.append({
+            "function": self.function_name,
+            "source": self.source,
+            "position": position,
+            "reason": reason,
+            "error": str(error)[:MAX_ERROR_LENGTH] if error is not None else None,
+            "record": record,
+            "rejected_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+        if len(self.entries) >= BATCH_SIZE:
+            self.flush()
+
+    def reject_insert_errors(self, errors, batch):
+        """
+        Dead-letters the rows BigQuery insert_rows reported errors for.
+        `batch` holds the (position, source record) pairs in insert order.
+        """
+
+        for error in errors:
+            position, record = batch[error["index"]]
+            self.reject(insert_error_reason(error["errors"]), record, error["errors"], position)
+
+    def flush(self):
+        if not self.entries:
+            return
+        blob_name = f"{self.function_name}/{self.source_name}.{self.started_at:%Y%m%dT%H%M%S}.part{len(self.uris):04d}.jsonl"
+        data = "".join(json.dumps(entry, default=str) + '\n' for entry in self.entries)
+        with metrics.span("dead_letter_write"):
+            self.bucket.blob(blob_name).upload_from_string(data, content_type="application/x-ndjson")
+        self.uris.append(f"gs://{DEAD_LETTER_BUCKET}/{blob_name}")
+        self.entries = []
+
+    def close(self):
+        """
+        Uploads the remaining entries and prints one summary line for the source file.
+        """
+
+        self.flush()
+        if self.uris:
+            reasons = ", ".join(f"{reason}={count}" for reason, count in sorted(self.reasons.items()))
+            print(f"Dead-lettered {sum(self.reasons.values())} records from {self.source} ({reasons}) to {', '.join(self.uris)}")
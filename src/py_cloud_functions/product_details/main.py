@@ -3,6 +3,8 @@ from google.cloud import bigquery
 from google.cloud import storage
 from functions_framework import cloud_event
 from google.cloud.exceptions import GoogleCloudError
+import metrics
+import dead_letter
 
 @cloud_event
 def trigger_bigquery_load(cloud_event):
@@ -47,15 +49,21 @@ def trigger_bigquery_load(cloud_event):
         try:
             # Download the blob content as bytes and decode it to a Python object.
             # list of dictionaries.
-            content = source_blob.download_as_bytes()
-            data = json.loads(content.decode('utf-8'))
+            with metrics.span("gcs_download"):
+                content = source_blob.download_as_bytes()
+            metrics.count("bytes", len(content))
+            with metrics.span("json_parse"):
+                data = json.loads(content.decode('utf-8'))
 
             # Check if the data is a list.
             if not isinstance(data, list):
                 print(f"Error: Expected a list of dictionaries in {file_name}")
                 return
 
+            # Rejected records go to the dead-letter bucket with a reason code.
+            dead_letters = dead_letter.DeadLetterWriter(storage_client, "product_details", bucket_name, file_name)
             rows_to_insert = []
+            batch = []
             inserted_count_file = 0
             for i, record in enumerate(data):
                 try:
@@ -67,36 +75,38 @@ def trigger_bigquery_load(cloud_event):
                             'url': record.get('url')
                         }
                         rows_to_insert.append(row)
+                        batch.append((i, record))
                     else:
-                        print(f"Warning: Skipping invalid record (not a dictionary) in {file_name}, index {i}: {record}")
+                        metrics.count("invalid_records")
+                        dead_letters.reject(dead_letter.NOT_OBJECT, record, position=i)
 
                     if len(rows_to_insert) >= 1000:
-                        errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                        if errors:
-                            print(f"Errors while loading data batch from {file_name}: {errors}")
-                        else:
-                            inserted_count_file += len(rows_to_insert)
-                            print(f"Inserted {len(rows_to_insert)} records from {file_name}")
+                        inserted = insert_batch(client, table_id, schema, rows_to_insert, batch, dead_letters)
+                        inserted_count_file += inserted
+                        print(f"Inserted {inserted} records from {file_name}")
                         rows_to_insert = []
+                        batch = []
 
                 except Exception as e:
-                    print(f"Error processing record {i} in {file_name}: {e}")
+                    metrics.count("errors")
+                    dead_letters.reject(dead_letter.TRANSFORM, record, e, i)
 
             # Insert remaining rows.
             if rows_to_insert:
-                errors = client.insert_rows(table_id, rows_to_insert, selected_fields=schema)
-                if errors:
-                    print(f"Errors while loading final data batch from {file_name}: {errors}")
-                else:
-                    inserted_count_file += len(rows_to_insert)
-                    print(f"Inserted {len(rows_to_insert)} records from {file_name}")
+                inserted = insert_batch(client, table_id, schema, rows_to_insert, batch, dead_letters)
+                inserted_count_file += inserted
+                print(f"Inserted {inserted} records from {file_name}")
             print(f"Finished processing file: {file_name}. Inserted {inserted_count_file} records.")
 
+            # Upload the rejects before moving the file, so a failed upload leaves the file in place.
+            dead_letters.close()
+
             # Move the processed file to the destination bucket.
             try:
                 destination_blob = destination_bucket.blob(file_name)
-                blob_copy = source_bucket.copy_blob(source_blob, destination_bucket, file_name)
-                source_blob.delete()
+                with metrics.span("blob_move"):
+                    blob_copy = source_bucket.copy_blob(source_blob, destination_bucket, file_name)
+                    source_blob.delete()
 
                 print(
                     f"Blob {file_name} in bucket {bucket_name} moved to blob {destination_blob.name} in bucket {destination_bucket_name}."
@@ -106,12 +116,26 @@ def trigger_bigquery_load(cloud_event):
 
 
         except json.JSONDecodeError as e:
+            metrics.count("errors")
             print(f"Error decoding JSON in {file_name}: {e}")
         except Exception as e:
+            metrics.count("errors")
             print(f"Error processing {file_name}: {e}, type={type(e)}")
 
 
     except GoogleCloudError as e:
         print(f"Google Cloud Error: {e}")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred: {e}")
+    finally:
+        metrics.flush("load_product_details", file=cloud_event.data.get('name'))
+
+
+def insert_batch(client, table_id, schema, rows_to_insert, batch, dead_letters):
+    """
+    Inserts one batch with retry and dead-letters the rows BigQuery rejects. Returns the number inserted.
+    """
+
+    rejected = dead_letter.insert_rows_with_retry(client, table_id, rows_to_insert, selected_fields=schema)
+    dead_letters.reject_insert_errors(rejected, batch)
+    return len(rows_to_insert) - len(rejected)
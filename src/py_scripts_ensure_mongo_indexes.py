@@ -0,0 +1,46 @@
+import argparse
+import logging
+import sys
+import pymongo
+import glamira_config
+import mongo_indexes
+
+# Read MongoDB configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
+
+# Setup logging format and level
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# MongoDB connection parameters
+mongodb_uri = config["mongodb"]["uri"]
+db_name = config["mongodb"]["database"]
+
+
+def ensure_mongo_indexes(mongodb_uri, db_name, check):
+    client = pymongo.MongoClient(mongodb_uri)
+    try:
+        db = client[db_name]
+        created = mongo_indexes.ensure_indexes(db)
+        logging.info(f"Created indexes: {', '.join(created)}" if created else "All indexes already exist")
+
+        if not check:
+            return True
+        ok = True
+        for result in mongo_indexes.check_plans(db):
+            if result["ok"]:
+                logging.info(f"Plan {result['name']}: {' > '.join(result['stages'])}")
+            else:
+                ok = False
+                logging.error(f"Plan {result['name']} regressed ({result['problem']}): {' > '.join(result['stages'])}")
+        return ok
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the indexes the pipeline queries need.")
+    parser.add_argument("--check", action="store_true", help="also explain each query and fail on plan regressions")
+    args = parser.parse_args()
+
+    if not ensure_mongo_indexes(mongodb_uri, db_name, args.check):
+        sys.exit(1)
@@ -1,22 +1,14 @@
-import configparser
 import pymongo
 import json
 import logging
 import datetime
 import os
+import glamira_config
+import metrics
 from google.cloud import storage
-from dotenv import load_dotenv
 
-# Load environment variables from .env
-load_dotenv()
-
-# Read multiple config files for app, MongoDB, and GCS
-config = configparser.ConfigParser()
-config.read([
-    "configs/app_config.ini",
-    "configs/mongodb_config.ini",
-    "configs/gcs_config.ini"
-])
+# Read app, MongoDB and GCS configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
 
 # Setup logging format and level
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,14 +23,20 @@ main_collection_name = "product_details"
 
 # Google Cloud Storage parameters
 bucket_name = config["gcs"]["bucket"]
-now = datetime.datetime.now()
-timestamp = now.strftime("%Y%m%d_%H%M%S")
-output_blob_name = f"product_details_{timestamp}.jsonl"
 
-def export_to_gcs():
+def export_to_gcs(client=None):
+    """
+    Exports the collection to a timestamped JSONL blob and returns the blob name.
+    A client passed in (e.g. the CLI's pooled one) is shared with other stages and left open.
+    """
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_blob_name = f"product_details_{timestamp}.jsonl"
+    owns_client = client is None
     try:
         # Connect to MongoDB
-        client = pymongo.MongoClient(mongodb_uri)
+        if owns_client:
+            client = pymongo.MongoClient(mongodb_uri)
         db = client[db_name]
         collection = db[main_collection_name]
 
@@ -54,22 +52,31 @@ def export_to_gcs():
             skip = 0
             while True:
                 cursor = collection.find({}, {"_id": 0}).skip(skip).limit(batch_size)
-                documents = list(cursor)
+                with metrics.span("mongo_find"):
+                    documents = list(cursor)
                 if not documents:
                     break
-                for doc in documents:
-                    f.write(json.dumps(doc, default=str) + '\n')
+                with metrics.span("json_encode"):
+                    lines = "".join(json.dumps(doc, default=str) + '\n' for doc in documents)
+                with metrics.span("gcs_write"):
+                    f.write(lines)
+                metrics.count("rows", len(documents))
+                if metrics.enabled:
+                    metrics.count("bytes", len(lines.encode('utf-8')))
                 skip += batch_size
 
         logging.info(f"Uploaded data to gs://{bucket_name}/{output_blob_name}")
 
     except Exception as e:
+        metrics.count("errors")
         logging.error(f"Error: {e}")
     finally:
+        metrics.flush("export_product_details", blob=output_blob_name)
         # Close MongoDB connection and log
-        if 'client' in locals():
+        if owns_client and client is not None:
             client.close()
         logging.info("Disconnected from MongoDB")
+    return output_blob_name
 
 if __name__ == "__main__":
     export_to_gcs()
@@ -0,0 +1,311 @@
+import argparse
+import datetime
+import ipaddress
+import json
+import random
+import uuid
+
+# Stores seen in the raw dumps: store_id -> (domain, currency symbol, price format)
+STORES = {
+    "6": ("www.glamira.de", "€", "de"),
+    "7": ("www.glamira.co.uk", "£", "en"),
+    "8": ("www.glamira.es", "€", "de"),
+    "9": ("www.glamira.at", "€", "de"),
+    "10": ("www.glamira.ch", "CHF", "ch"),
+    "11": ("www.glamira.nl", "€", "de"),
+    "12": ("www.glamira.fr", "€", "fr"),
+    "14": ("www.glamira.it", "€", "de"),
+    "19": ("www.glamira.se", "kr", "fr"),
+    "29": ("www.glamira.com.au", "AU $", "en"),
+    "34": ("www.glamira.pt", "€", "fr"),
+    "38": ("www.glamira.ca", "CAD $", "en"),
+    "41": ("www.glamira.com", "$", "en"),
+    "50": ("www.glamira.pl", "zł", "fr"),
+    "52": ("www.glamira.rs", "din.", "de"),
+    "53": ("www.glamira.sk", "€", "fr"),
+    "66": ("www.glamira.bg", "лв.", "de"),
+}
+
+# Relative frequency of each event type in production traffic
+COLLECTION_WEIGHTS = {
+    "view_product_detail": 20,
+    "view_listing_page": 12,
+    "select_product_option": 8,
+    "view_landing_page": 6,
+    "view_home_page": 6,
+    "add_to_cart_action": 4,
+    "view_shopping_cart": 4,
+    "select_product_option_quality": 3,
+    "product_detail_recommendation_visible": 3,
+    "product_detail_recommendation_noticed": 2,
+    "listing_page_recommendation_visible": 2,
+    "listing_page_recommendation_noticed": 2,
+    "landing_page_recommendation_visible": 2,
+    "landing_page_recommendation_noticed": 2,
+    "checkout": 2,
+    "search_box_action": 2,
+    "view_static_page": 2,
+    "checkout_success": 1.5,
+    "product_detail_recommendation_clicked": 1,
+    "listing_page_recommendation_clicked": 1,
+    "landing_page_recommendation_clicked": 1,
+    "product_view_all_recommend_clicked": 1,
+    "view_all_recommend": 1,
+    "back_to_product_action": 1,
+    "view_sorting_relevance": 1,
+    "sorting_relevance_click_action": 1,
+    "view_my_account": 1,
+}
+
+PRODUCT_KINDS = ["ring", "pendant", "bracelet", "earring", "necklace", "diamonds-ohrstecker"]
+PRODUCT_NAMES = ["brianna", "pamela", "viktor", "elise", "louisa", "linderoth", "fabiolita", "cool-breeze",
+                 "eternal-heaven", "alluring-fancy", "ezira", "mira", "solene", "arvid", "kalina", "tamsin"]
+ALLOYS = [("white-585", "Weißgold 585"), ("red-585", "Rotgold 585"), ("yellow-750", "Gelbgold 750"),
+          ("white_red-375", "Weiß-Rotgold 375"), ("white-silber", "Silber 925"), ("platin-950", "Platin 950")]
+STONES = [("diamond-Brillant", "Diamond"), ("diamond-sapphire", "White Sapphire"), ("ruby", "Ruby"),
+          ("aquamarine", "Aquamarine"), ("diamond-Zirconia", "Swarovsky Cristall")]
+LISTING_PATHS = ["diamond-rings/", "engagement-rings/", "men-s-necklaces/", "diamond-earrings/aquamarine/",
+                 "anelli-argento/", "alianzas/", "bracelet-de-cheville/argent-925/"]
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:77.0) Gecko/20100101 Firefox/77.0",
+    "Mozilla/5.0 (Windows NT 10.0; WOW64; Trident/7.0; rv:11.0) like Gecko",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 13_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.1.1 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 7.1.2; Redmi Note 5A Prime) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/78.0.3904.62 Mobile Safari/537.36",
+]
+RESOLUTIONS = ["1422x800", "1280x720", "1920x1080", "360x640", "375x667", "414x896"]
+
+FIRST_PRODUCT_ID = 80000
+MASK64 = 2 ** 64 - 1
+# UTC, so time_stamp and the ObjectId timestamps do not depend on the machine time zone
+START_TIME = datetime.datetime(2020, 3, 31, tzinfo=datetime.timezone.utc)
+
+
+def product_slug(product_id):
+    kind = PRODUCT_KINDS[product_id % len(PRODUCT_KINDS)]
+    name = PRODUCT_NAMES[(product_id // len(PRODUCT_KINDS)) % len(PRODUCT_NAMES)]
+    return f"glamira-{kind}-{name}-{product_id}"
+
+
+def format_price(amount, style):
+    """
+    Formats a price the way each store's frontend renders it, e.g. 1,278.00 / 1.278,00 / 1 278,00.
+    """
+
+    text = f"{amount:,.2f}"
+    if style == "de":
+        return text.replace(",", " ").replace(".", ",").replace(" ", ".")
+    if style == "fr":
+        return text.replace(",", " ").replace(".", ",")
+    if style == "ch":
+        return text.replace(",", "'")
+    return text
+
+
+class EventGenerator:
+    """
+    Generates userbeh-style events with skewed IP and product popularity, modeled on sample_raw_data.txt.
+    """
+
+    def __init__(self, count, seed=0, product_count=20000, ipv6_ratio=0.05):
+        self.random = random.Random(seed)
+        self.collections = list(COLLECTION_WEIGHTS)
+        self.weights = list(COLLECTION_WEIGHTS.values())
+        self.product_count = product_count
+        # IPs and device ids are derived from their index on demand, so memory stays flat in count
+        self.ip_count = max(count // 20, 1)
+        self.device_count = max(count // 10, 1)
+        self.ipv6_threshold = int(ipv6_ratio * 2 ** 64)
+        self.salt = self.random.getrandbits(64)
+        self.next_order_id = 600000000
+
+    def hashed(self, kind, index):
+        # splitmix64 finalizer over (seed, kind, index): well spread, reproducible per seed
+        value = (self.salt ^ (kind << 56) ^ index) + 0x9E3779B97F4A7C15 & MASK64
+        value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+        value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+        return value ^ (value >> 31)
+
+    def ip(self, index):
+        if self.hashed(0, index) < self.ipv6_threshold:
+            return str(ipaddress.IPv6Address(self.hashed(1, index) << 64 | self.hashed(2, index)))
+        return str(ipaddress.IPv4Address(0x01000000 + self.hashed(1, index) % (0xDFFFFFFF - 0x01000000 + 1)))
+
+    def device_id(self, index):
+        return str(uuid.UUID(int=self.hashed(3, index) << 64 | self.hashed(4, index), version=4))
+
+    def skewed_index(self, count):
+        return int(count * self.random.random() ** 2)
+
+    def skewed_choice(self, values):
+        # Squared uniform index so the first values dominate while the tail still shows up, like real traffic
+        return values[self.skewed_index(len(values))]
+
+    def product_id(self):
+        return FIRST_PRODUCT_ID + int(self.product_count * self.random.random() ** 3)
+
+    def product_url(self, domain, product_id):
+        alloy = self.random.choice(ALLOYS)[0]
+        stone = self.random.choice(STONES)[0]
+        return f"https://{domain}/{product_slug(product_id)}.html?alloy={alloy}&diamond={stone}"
+
+    def option_array(self, numeric_ids):
+        options = []
+        for label, values in (("alloy", ALLOYS), ("diamond", STONES))[:self.random.randint(1, 2)]:
+            value_id, value_label = self.random.choice(values)
+            option_id = self.random.randint(50000, 400000)
+            option_value_id = self.random.randint(300000, 3300000)
+            options.append({
+                "option_label": label,
+                "option_id": option_id if numeric_ids else str(option_id),
+                "value_label": value_label if numeric_ids else self.random.choice(["", value_id]),
+                "value_id": option_value_id if numeric_ids else str(option_value_id),
+            })
+        return options
+
+    def cart_products(self, style, currency, with_price):
+        products = []
+        for _ in range(self.random.randint(1, 3)):
+            product = {"product_id": self.product_id(), "amount": self.random.randint(1, 2)}
+            if with_price:
+                product["price"] = format_price(self.random.uniform(50, 3000), style)
+                product["currency"] = currency
+            product["option"] = self.option_array(numeric_ids=True)
+            products.append(product)
+        return products
+
+    def event(self, index):
+        collection = self.random.choices(self.collections, self.weights)[0]
+        store_id = self.skewed_choice(list(STORES))
+        domain, currency, style = STORES[store_id]
+        timestamp = START_TIME + datetime.timedelta(seconds=index * 7 + self.random.randint(0, 6))
+        local_time = timestamp + datetime.timedelta(hours=self.random.randint(-8, 3))
+        event = {
+            "_id": {"$oid": f"{int(timestamp.timestamp()):08x}{self.random.getrandbits(64):016x}"},
+            "time_stamp": int(timestamp.timestamp()),
+            "ip": self.ip(self.skewed_index(self.ip_count)),
+            "user_agent": self.random.choice(USER_AGENTS),
+            "resolution": self.random.choice(RESOLUTIONS),
+            "user_id_db": str(self.random.randint(100000, 600000)) if self.random.random() < 0.2 else "",
+            "device_id": self.device_id(self.skewed_index(self.device_count)),
+            "api_version": "1.0",
+            "store_id": store_id,
+            "local_time": f"{local_time:%Y-%m-%d} {local_time.hour}:{local_time:%M:%S}",
+            "show_recommendation": "false",
+            "current_url": f"https://{domain}/{self.random.choice(LISTING_PATHS)}",
+            "referrer_url": self.random.choice(["", "https://www.google.com/", f"https://{domain}/"]),
+            "email_address": "",
+            "collection": collection,
+        }
+
+        product_id = self.product_id()
+        if collection in ("view_product_detail", "select_product_option", "select_product_option_quality",
+                          "add_to_cart_action", "back_to_product_action"):
+            event["current_url"] = self.product_url(domain, product_id)
+            event["product_id"] = str(product_id)
+            if collection == "view_product_detail":
+                event.update({"recommendation": False, "utm_source": False, "utm_medium": False})
+            if collection == "add_to_cart_action":
+                event.update({"price": format_price(self.random.uniform(50, 3000), style),
+                              "currency": currency, "is_paypal": None})
+            if collection != "back_to_product_action":
+                event["option"] = self.option_array(numeric_ids=False)
+            if collection == "select_product_option_quality":
+                event["option"][0].update({"quality": self.random.choice("AAB"), "quality_label": "I"})
+        elif collection.startswith("product_detail_recommendation"):
+            event["current_url"] = self.product_url(domain, product_id)
+            event["viewing_product_id"] = str(product_id)
+            if collection.endswith("clicked"):
+                event["recommendation_product_id"] = str(self.product_id())
+                event["recommendation_clicked_position"] = self.random.randint(0, 11)
+        elif collection in ("view_listing_page", "view_sorting_relevance") or collection.startswith("listing_page"):
+            event["option"] = {"alloy": self.random.choice(["", ALLOYS[0][0]]), "diamond": "", "shapediamond": ""}
+            event.update({"cat_id": None, "collect_id": ""})
+        elif collection in ("view_all_recommend", "product_view_all_recommend_clicked"):
+            event["current_url"] = f"https://{domain}/county/recommendation/list/id/{product_id}/price/560.00"
+            event["product_id" if collection == "view_all_recommend" else "viewing_product_id"] = str(product_id)
+            if collection == "product_view_all_recommend_clicked":
+                event.update({"recommendation_product_id": str(self.product_id()),
+                              "recommendation_product_position": ""})
+        elif collection in ("landing_page_recommendation_clicked", "sorting_relevance_click_action"):
+            event["recommendation_product_id"] = str(product_id)
+            event["recommendation_product_position"] = self.random.choice([7, "51", ""])
+        elif collection == "search_box_action":
+            event["key_search"] = self.random.choice([None, "ring", "gold"])
+        elif collection == "view_home_page":
+            event["current_url"] = f"https://{domain}/"
+        elif collection == "view_shopping_cart":
+            event["current_url"] = f"https://{domain}/checkout/cart/"
+            event["cart_products"] = self.cart_products(style, currency, with_price=False)
+        elif collection in ("checkout", "checkout_success"):
+            event["email_address"] = f"customer{self.random.randint(1, 99999)}@example.com"
+            if collection == "checkout":
+                event["current_url"] = f"https://{domain}/customcheckout/onepage/payment/"
+                event["order_id"] = ""
+                event["cart_products"] = self.cart_products(style, currency, with_price=False)
+            else:
+                event["current_url"] = f"https://{domain}/checkout/onepage/success/"
+                event["order_id"] = self.next_order_id
+                self.next_order_id += self.random.randint(1, 50)
+                event["cart_products"] = self.cart_products(style, currency, with_price=True)
+        return event
+
+
+def generate_events(count, seed=0):
+    """
+    Yields `count` userbeh documents in the relaxed extended JSON shape of the raw dumps.
+    """
+
+    generator = EventGenerator(count, seed)
+    for index in range(count):
+        yield generator.event(index)
+
+
+def to_canonical(value):
+    """
+    Converts a relaxed document into canonical extended JSON as produced by mongoexport.
+    """
+
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return {"$numberInt": str(value)} if -2**31 <= value < 2**31 else {"$numberLong": str(value)}
+    if isinstance(value, float):
+        return {"$numberDouble": repr(value)}
+    if isinstance(value, list):
+        return [to_canonical(item) for item in value]
+    return {key: to_canonical(item) for key, item in value.items()}
+
+
+def write_dump(path, count, seed=0):
+    """
+    Writes events as concatenated, tab-indented {_id, collection, sample} wrappers like sample_raw_data.txt.
+    """
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for index, event in enumerate(generate_events(count, seed)):
+            wrapper = {"_id": {"$oid": f"{index:024x}"}, "collection": event["collection"], "sample": event}
+            f.write(json.dumps(wrapper, ensure_ascii=False, indent='\t', separators=(',', ':')))
+
+
+def write_jsonl(path, count, seed=0):
+    """
+    Writes events as canonical extended JSON lines, the input of the raw_data loader function.
+    """
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in generate_events(count, seed):
+            f.write(json.dumps(to_canonical(event), ensure_ascii=False) + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic userbeh events.")
+    parser.add_argument("count", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["dump", "jsonl"], default="dump")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.format == "dump":
+        write_dump(args.output, args.count, args.seed)
+    else:
+        write_jsonl(args.output, args.count, args.seed)
@@ -0,0 +1,220 @@
+import argparse
+import codecs
+import json
+import logging
+import multiprocessing
+import os
+import re
+import pymongo
+import glamira_config
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+# Read app and MongoDB configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
+
+# Setup logging format and level
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# MongoDB connection parameters
+mongodb_uri = config["mongodb"]["uri"]
+db_name = config["mongodb"]["database"]
+main_collection_name = "userbeh"
+
+# Import params: documents per insert_many and directory of per-range byte offset checkpoints
+insert_batch_size = 10000
+read_size = 1 << 20
+checkpoint_dir = "import_checkpoints"
+
+DUPLICATE_KEY_ERROR = 11000
+JSON_WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+
+def find_object_boundary(f, offset):
+    """
+    Returns the byte offset of the first top-level object starting at or after offset.
+    Dumps are pretty-printed, so only the closing brace of a top-level object sits at column 0.
+    """
+
+    if offset == 0:
+        return 0
+    f.seek(offset - 1)
+    position = offset - 1
+    tail = b""
+    while True:
+        block = f.read(read_size)
+        if not block:
+            return position + len(tail)
+        data = tail + block
+        index = data.find(b"\n}")
+        if index != -1:
+            return position + index + 2
+        position += len(data) - 1
+        tail = data[-1:]
+
+
+def compute_byte_ranges(path, workers):
+    """
+    Splits a dump file into at most `workers` byte ranges aligned to object boundaries.
+    """
+
+    file_size = os.path.getsize(path)
+    step = max(file_size // workers, 1)
+    with open(path, 'rb') as f:
+        boundaries = sorted({find_object_boundary(f, min(i * step, file_size)) for i in range(workers)})
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def iter_wrappers(path, start, end):
+    """
+    Stream-parses concatenated JSON objects whose first byte lies in [start, end).
+    Yields (offset after the object, object) without reading the whole file into memory.
+    """
+
+    decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ""
+    position = 0
+    offset = start
+    eof = False
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while True:
+            # Skip whitespace between objects; it is ASCII so characters equal bytes
+            object_start = JSON_WHITESPACE.match(buffer, position).end()
+            offset += object_start - position
+            position = object_start
+            if offset >= end:
+                return
+
+            if position < len(buffer):
+                try:
+                    obj, stop = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Object spans past the buffered data unless the file is exhausted
+                    if eof:
+                        raise
+                else:
+                    offset += len(buffer[position:stop].encode('utf-8'))
+                    position = stop
+                    yield offset, obj
+                    continue
+            elif eof:
+                return
+
+            # Drop parsed text and buffer the next block
+            block = f.read(read_size)
+            eof = not block
+            buffer = buffer[position:] + text_decoder.decode(block, final=eof)
+            position = 0
+
+
+def unwrap_sample(wrapper):
+    """
+    Converts an exported {_id, collection, sample} wrapper into a userbeh document.
+    """
+
+    document = wrapper.get("sample")
+    if not isinstance(document, dict):
+        # Already a plain event document
+        return wrapper
+    if "collection" not in document and "collection" in wrapper:
+        document["collection"] = wrapper["collection"]
+    return document
+
+
+def checkpoint_path(path, start, end):
+    return os.path.join(checkpoint_dir, f"{os.path.basename(path)}.{start}-{end}.offset")
+
+
+def read_checkpoint(path, start, end):
+    try:
+        with open(checkpoint_path(path, start, end), 'r') as f:
+            return max(int(f.read()), start)
+    except (FileNotFoundError, ValueError):
+        return start
+
+
+def write_checkpoint(path, start, end, offset):
+    with open(checkpoint_path(path, start, end), 'w') as f:
+        f.write(str(offset))
+
+
+def insert_batch(collection, documents):
+    """
+    Unordered insert_many; duplicate keys from a resumed range are ignored.
+    Returns the number of newly inserted documents.
+    """
+
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in write_errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+def import_range(task):
+    """
+    Imports one byte range of a dump file, resuming from its checkpointed offset.
+    """
+
+    path, start, end, batch_size = task
+    resume_offset = read_checkpoint(path, start, end)
+    if resume_offset >= end:
+        return 0
+
+    # Each worker process opens its own MongoDB connection
+    client = pymongo.MongoClient(mongodb_uri)
+    try:
+        collection = client[db_name][main_collection_name]
+        documents = []
+        inserted_count = 0
+        for offset, wrapper in iter_wrappers(path, resume_offset, end):
+            documents.append(unwrap_sample(wrapper))
+            if len(documents) >= batch_size:
+                inserted_count += insert_batch(collection, documents)
+                write_checkpoint(path, start, end, offset)
+                documents = []
+
+        if documents:
+            inserted_count += insert_batch(collection, documents)
+        write_checkpoint(path, start, end, end)
+        logging.info(f"Imported {inserted_count} documents from {path} bytes {resume_offset}-{end}")
+        return inserted_count
+    finally:
+        client.close()
+
+
+def import_raw_data(path, workers, batch_size):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    ranges = compute_byte_ranges(path, workers)
+    if not ranges:
+        # An empty dump has no ranges, and a pool of zero processes is an error
+        logging.info(f"Nothing to import: {path} is empty")
+        return 0
+    logging.info(f"Importing {path} into '{main_collection_name}' with {len(ranges)} workers")
+
+    tasks = [(path, start, end, batch_size) for start, end in ranges]
+    with multiprocessing.Pool(processes=len(tasks)) as pool:
+        total_inserted = sum(pool.imap_unordered(import_range, tasks))
+
+    # Only clear checkpoints once every range is fully imported
+    for start, end in ranges:
+        os.remove(checkpoint_path(path, start, end))
+    logging.info(f"Total imported: {total_inserted} documents from {path}")
+    return total_inserted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import raw event dumps into the userbeh collection.")
+    parser.add_argument("paths", nargs="+", help="dump files of concatenated {_id, collection, sample} objects")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=insert_batch_size)
+    args = parser.parse_args()
+
+    for dump_path in args.paths:
+        import_raw_data(dump_path, args.workers, args.batch_size)
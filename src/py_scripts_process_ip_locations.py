@@ -1,17 +1,12 @@
-import configparser
+import argparse
 import pymongo
 import IP2Location
-from dotenv import load_dotenv
+import glamira_config
+import metrics
+import mongo_indexes
 
-# Load environment variables
-load_dotenv()
-
-# Read MongoDB and IP2Location configs
-config = configparser.ConfigParser()
-config.read([
-    "configs/mongodb_config.ini",
-    "configs/ip2location_config.ini"
-])
+# Read MongoDB and IP2Location configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
 
 # MongoDB parameters and collections
 mongodb_uri = config["mongodb"]["uri"]
@@ -22,10 +17,30 @@ location_collection_name = "user_ip_locations"
 # IP2Location database path
 ip2location_db_path = config["ip2location"]["db_path"]
 
-def process_ip_locations(mongodb_uri, db_name, main_collection_name, location_collection_name, ip2location_db_path):
+def distinct_ips_group(main_collection):
+    # Server-side distinct: simple, but spills to disk and loads the Mongo server on large collections
+    pipeline = mongo_indexes.DISTINCT_IPS_PIPELINE
+    for doc in metrics.timed_iter("mongo_aggregate", main_collection.aggregate(pipeline, allowDiskUse=True)):
+        yield doc["ip"]
+
+def distinct_ips_packed(main_collection, workers, dedupe):
+    # Client-side distinct over parallel _id ranges, yielding IPs in numeric order for lookup locality
+    import distinct_ips
+
+    with metrics.span("mongo_find"):
+        ipv4, ipv6, other = distinct_ips.extract_distinct_ips(main_collection, workers, dedupe)
+    metrics.count("distinct_ipv4", len(ipv4))
+    metrics.count("distinct_ipv6", len(ipv6))
+    return distinct_ips.iter_ips(ipv4, ipv6, other)
+
+def process_ip_locations(mongodb_uri, db_name, main_collection_name, location_collection_name, ip2location_db_path,
+                         extractor="group", workers=4, dedupe="sort", client=None):
+    # A client passed in (e.g. the CLI's pooled one) is shared with other stages and left open
+    owns_client = client is None
     try:
         # Connect to MongoDB and open IP2Location DB
-        client = pymongo.MongoClient(mongodb_uri)
+        if owns_client:
+            client = pymongo.MongoClient(mongodb_uri)
         db = client[db_name]
         main_collection = db[main_collection_name]
         location_collection = db[location_collection_name]
@@ -33,17 +48,20 @@ def process_ip_locations(mongodb_uri, db_name, main_collection_name, location_co
         ip2loc_obj = IP2Location.IP2Location()
         ip2loc_obj.open(ip2location_db_path)
 
-        # Aggregate unique IPs from main collection
-        pipeline = [{"$group": {"_id": "$ip"}}, {"$project": {"ip": "$_id", "_id": 0}}]
+        # Unique IPs from main collection
+        if extractor == "packed":
+            ips = distinct_ips_packed(main_collection, workers, dedupe)
+        else:
+            ips = distinct_ips_group(main_collection)
 
         bulk_operations = []
         processed_count = 0
 
         # Process each unique IP: query IP2Location DB and prepare insert
-        for doc in main_collection.aggregate(pipeline, allowDiskUse=True):
-            ip = doc["ip"]
+        for ip in ips:
             try:
-                record = ip2loc_obj.get_all(ip)
+                with metrics.span("ip_lookup"):
+                    record = ip2loc_obj.get_all(ip)
                 location_data = {
                     "ipAddress": ip,
                     "country_code": record.country_short,
@@ -55,7 +73,9 @@ def process_ip_locations(mongodb_uri, db_name, main_collection_name, location_co
 
                 # Bulk write in chunks of 100,000
                 if len(bulk_operations) >= 100000:
-                    location_collection.bulk_write(bulk_operations)
+                    with metrics.span("mongo_bulk_write"):
+                        location_collection.bulk_write(bulk_operations)
+                    metrics.count("rows", len(bulk_operations))
                     bulk_operations = []
                     processed_count += 100000
                     print(f"Processed {processed_count} IPs.")
@@ -65,17 +85,30 @@ def process_ip_locations(mongodb_uri, db_name, main_collection_name, location_co
 
         # Write any remaining operations
         if bulk_operations:
-            location_collection.bulk_write(bulk_operations)
+            with metrics.span("mongo_bulk_write"):
+                location_collection.bulk_write(bulk_operations)
+            metrics.count("rows", len(bulk_operations))
             print(f"Processed {processed_count + len(bulk_operations)} IPs.")
 
     except Exception as e:
+        metrics.count("errors")
         print(f"Main error: {e}")
     finally:
+        metrics.flush("process_ip_locations")
         # Cleanup: close MongoDB and IP2Location DB connections
-        if 'client' in locals():
+        if owns_client and client is not None:
             client.close()
         if 'ip2loc_obj' in locals():
             ip2loc_obj.close()
 
 if __name__ == "__main__":
-    process_ip_locations(mongodb_uri, db_name, main_collection_name, location_collection_name, ip2location_db_path)
+    parser = argparse.ArgumentParser(description="Look up the location of every distinct IP in userbeh.")
+    parser.add_argument("--extractor", choices=["group", "packed"], default="group",
+                        help="server-side $group, or client-side packed integer arrays")
+    parser.add_argument("--workers", type=int, default=4, help="parallel _id ranges for the packed extractor")
+    parser.add_argument("--dedupe", choices=["sort", "bitmap"], default="sort",
+                        help="IPv4 deduplication of the packed extractor")
+    args = parser.parse_args()
+
+    process_ip_locations(mongodb_uri, db_name, main_collection_name, location_collection_name, ip2location_db_path,
+                         args.extractor, args.workers, args.dedupe)
@@ -1,4 +1,4 @@
-import configparser
+import argparse
 import pymongo
 import logging
 import requests
@@ -6,18 +6,14 @@ import time
 from tqdm import tqdm
 import os
 import multiprocessing
+import glamira_config
+import metrics
+import mongo_indexes
+import product_names
 from bs4 import BeautifulSoup
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# Read MongoDB and crawling configs
-config = configparser.ConfigParser()
-config.read([
-    "configs/mongodb_config.ini",
-    "configs/crawling_config.ini"
-])
+# Read MongoDB and crawling configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
 
 # Setup logger with file and console handlers
 logger = logging.getLogger(__name__)
@@ -54,22 +50,81 @@ def process_url(doc):
         logger.error(f"Error fetching {current_url}: {e}")
         return None
 
-def crawl_product_details(mongodb_uri, db_name, main_collection_name, location_collection_name):
+def timed_process_url(doc):
+    # Runs in pool workers, so the HTTP time is returned and recorded by the parent process
+    start = time.perf_counter()
+    result = process_url(doc)
+    return result, time.perf_counter() - start
+
+def resolve_cached_names(main_collection, details_collection, name_cache):
+    """
+    Resolves product names from the name cache, earlier crawls and URL slugs, stores them in
+    product_details and returns only the products that still need an HTTP fetch.
+    """
+
+    with metrics.span("mongo_aggregate"):
+        candidates = {doc["_id"]: [doc.get("product_url"), doc.get("current_url")]
+                      for doc in main_collection.aggregate(mongo_indexes.PRODUCT_URL_CANDIDATES_PIPELINE,
+                                                           allowDiskUse=True)
+                      if doc["_id"] is not None}
+
+    # Names already stored; the resolver marks its own writes with name_source
+    with metrics.span("mongo_find"):
+        stored = {
+            doc["product_id"]: (doc["product_name"], doc.get("url"), doc.get("name_source"))
+            for doc in details_collection.find({"product_name": {"$nin": [None, product_names.MISSING_NAME]}},
+                                               {"_id": 0, "product_id": 1, "product_name": 1, "url": 1,
+                                                "name_source": 1})
+        }
+    # Names crawled before, from any glamira.* store domain; slug guesses are not crawls
+    previous_crawls = {product_id: (name, url) for product_id, (name, url, name_source) in stored.items()
+                       if name_source != product_names.SLUG}
+
+    with metrics.span("name_resolution"):
+        resolved, to_fetch, stats = product_names.resolve_product_names(candidates, name_cache, previous_crawls)
+
+    # Upsert so a resolved name also replaces an earlier 'N/A' crawl result
+    operations = [
+        pymongo.UpdateOne({"product_id": product_id},
+                          {"$set": {"product_name": details["product_name"], "url": details["url"],
+                                    "name_source": details["name_source"]}}, upsert=True)
+        for product_id, details in resolved.items()
+        if details["source"] != product_names.PREVIOUS_CRAWL
+        and stored.get(product_id) != (details["product_name"], details["url"], details["name_source"])
+    ]
+    if operations:
+        with metrics.span("mongo_bulk_write"):
+            details_collection.bulk_write(operations, ordered=False)
+        metrics.count("rows", len(operations))
+
+    for source, count in stats.items():
+        metrics.count(f"names_{source}", count)
+    logger.info(product_names.hit_rate_report(stats))
+    return to_fetch
+
+def crawl_product_details(mongodb_uri, db_name, main_collection_name, location_collection_name, client=None,
+                          name_cache_path=None):
+    # A client passed in (e.g. the CLI's pooled one) is shared with other stages and left open
+    owns_client = client is None
+    name_cache = None
     try:
         # Connect to MongoDB collections
-        client = pymongo.MongoClient(mongodb_uri)
+        if owns_client:
+            client = pymongo.MongoClient(mongodb_uri)
         db = client[db_name]
         main_collection = db[main_collection_name]
         new_collection = db[location_collection_name]
 
-        # Aggregate unique products with URLs from main collection events
-        pipeline = [
-            {"$match": {"collection": {"$in": ["view_product_detail", "select_product_option", "select_product_option_quality"]}}},
-            {"$group": {"_id": "$product_id", "current_url": {"$first": "$current_url"}}},
-            {"$project": {"_id": 0, "product_id": "$_id", "current_url": 1}}
-        ]
+        if name_cache_path:
+            # Only crawl the products the cache, earlier crawls and URL slugs cannot name
+            name_cache = product_names.ProductNameCache(name_cache_path)
+            total_docs = resolve_cached_names(main_collection, new_collection, name_cache)
+        else:
+            # Aggregate unique products with URLs from main collection events
+            pipeline = mongo_indexes.PRODUCT_URLS_PIPELINE
 
-        total_docs = list(main_collection.aggregate(pipeline))
+            with metrics.span("mongo_aggregate"):
+                total_docs = list(main_collection.aggregate(pipeline))
         total_count = len(total_docs)
 
         # Read checkpoint file to resume progress if exists
@@ -82,11 +137,21 @@ def crawl_product_details(mongodb_uri, db_name, main_collection_name, location_c
         # Use multiprocessing pool and tqdm progress bar for concurrent crawling
         with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
             with tqdm(total=total_count, initial=total_processed, desc="Processing", unit="record") as pbar:
-                for result in pool.imap_unordered(process_url, total_docs):
+                for result, fetch_seconds in pool.imap_unordered(timed_process_url, total_docs):
+                    metrics.observe("http_fetch_seconds", fetch_seconds)
                     if result:
-                        # Insert new product details if not exists
-                        if new_collection.find_one({"product_id": result["product_id"]}) is None:
-                            new_collection.insert_one(result)
+                        with metrics.span("mongo_insert"):
+                            if name_cache is not None and result["product_name"] != product_names.MISSING_NAME:
+                                # A fetched name replaces a slug guess or stale name the resolver stored
+                                new_collection.update_one({"product_id": result["product_id"]},
+                                                          {"$set": result, "$unset": {"name_source": ""}}, upsert=True)
+                            # Insert new product details if not exists
+                            elif new_collection.find_one({"product_id": result["product_id"]}) is None:
+                                new_collection.insert_one(result)
+                        metrics.count("rows")
+                        if name_cache is not None and result["product_name"] != product_names.MISSING_NAME:
+                            name_cache.put_many([(result["product_id"], result["product_name"], result["url"],
+                                                  product_names.HTTP)])
                         total_processed += 1
                         pbar.update(1)
 
@@ -94,15 +159,21 @@ def crawl_product_details(mongodb_uri, db_name, main_collection_name, location_c
                         if total_processed % batch_size == 0:
                             with open(checkpoint_file, 'w') as f:
                                 f.write(str(total_processed))
+                    else:
+                        metrics.count("http_errors")
 
         logger.info(f"Total processed: {total_processed} records.")
 
     except Exception as e:
+        metrics.count("errors")
         logger.exception(f"Unexpected error: {e}")
     finally:
+        metrics.flush("crawl_product_details")
         # Close MongoDB client
-        if 'client' in locals():
+        if owns_client and client is not None:
             client.close()
+        if name_cache is not None:
+            name_cache.close()
 
         # Remove checkpoint file after completion
         try:
@@ -111,5 +182,11 @@ def crawl_product_details(mongodb_uri, db_name, main_collection_name, location_c
             logger.warning(f"Error removing checkpoint file: {e}")
 
 if __name__ == "__main__":
-    crawl_product_details(mongodb_uri, db_name, main_collection_name, location_collection_name)
+    parser = argparse.ArgumentParser(description="Crawl the product names of viewed products.")
+    parser.add_argument("--name-cache", help="SQLite product-name cache; resolve names from it, earlier crawls "
+                                             "and URL slugs first and only crawl the rest")
+    args = parser.parse_args()
+
+    crawl_product_details(mongodb_uri, db_name, main_collection_name, location_collection_name,
+                          name_cache_path=args.name_cache)
     logger.info("Crawling completed.")
@@ -0,0 +1,116 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+from collections import defaultdict
+from dotenv import load_dotenv
+
+# Load environment variables from .env
+load_dotenv()
+
+# Setup logging format and level
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# raw_data reads mongoexport JSON lines (the userbeh stream dead-letters the same), the other loader functions a JSON list
+JSONL_FUNCTIONS = {"raw_data", "stream_userbeh"}
+
+
+def read_entries(paths, storage_client=None):
+    """
+    Yields dead-letter entries from local JSONL files and gs://bucket/object or gs://bucket/prefix/ URIs.
+    """
+
+    for path in paths:
+        if not path.startswith("gs://"):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            continue
+
+        bucket_name, _, prefix = path[len("gs://"):].partition("/")
+        for blob in storage_client.list_blobs(bucket_name, prefix=prefix):
+            if not blob.name.endswith(".jsonl"):
+                continue
+            for line in blob.download_as_text().splitlines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+def replay_content(function_name, records):
+    """
+    Serializes the records in the input format of the function that rejected them.
+    Undecodable raw_data lines are stored as strings and written back verbatim.
+    """
+
+    if function_name in JSONL_FUNCTIONS:
+        return "".join((record if isinstance(record, str) else json.dumps(record)) + '\n' for record in records)
+    return json.dumps(records)
+
+
+def replay_name(source_name, started_at):
+    stem = source_name[:-len(".json")] if source_name.endswith(".json") else source_name
+    return f"{stem}.replay_{started_at:%Y%m%dT%H%M%S}.json"
+
+
+def replay_dead_letters(paths, reasons=None, output_dir=None, dry_run=False):
+    """
+    Groups dead-letter entries by function and source file and writes each group back as a new
+    input file: into the source bucket (which triggers the loader function again) or into output_dir.
+    """
+
+    storage_client = None
+    if any(path.startswith("gs://") for path in paths) or not (output_dir or dry_run):
+        from google.cloud import storage
+        storage_client = storage.Client()
+
+    groups = defaultdict(list)
+    skipped = 0
+    for entry in read_entries(paths, storage_client):
+        if reasons and entry["reason"] not in reasons:
+            skipped += 1
+            continue
+        if entry["record"] is None:
+            # Points at where a source file stopped parsing; the file itself has to be fixed and reloaded
+            logging.warning(f"Not replaying {entry['reason']} at position {entry['position']} of {entry['source']}: "
+                            f"{entry['error']}")
+            skipped += 1
+            continue
+        groups[(entry["function"], entry["source"])].append(entry)
+
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+    for (function_name, source), entries in sorted(groups.items()):
+        entries.sort(key=lambda entry: (entry["position"] is None, entry["position"]))
+        records = [entry["record"] for entry in entries]
+        bucket_name, _, source_name = source[len("gs://"):].partition("/")
+        name = replay_name(source_name, started_at)
+
+        if dry_run:
+            logging.info(f"Would replay {len(records)} {function_name} records from {source} as {name}")
+            continue
+        content = replay_content(function_name, records)
+        if output_dir:
+            target = os.path.join(output_dir, bucket_name, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(content)
+        else:
+            target = f"gs://{bucket_name}/{name}"
+            storage_client.bucket(bucket_name).blob(name).upload_from_string(content, content_type="application/json")
+        logging.info(f"Replayed {len(records)} {function_name} records from {source} to {target}")
+
+    if skipped:
+        logging.info(f"Skipped {skipped} entries with other reasons or without a record")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay dead-lettered records through the loader functions.")
+    parser.add_argument("paths", nargs="+", help="dead-letter JSONL files or gs:// objects/prefixes")
+    parser.add_argument("--reason", action="append", dest="reasons",
+                        help="only replay entries with this reason code (repeatable)")
+    parser.add_argument("--output-dir", help="write the replay files here instead of the source buckets")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be replayed")
+    args = parser.parse_args()
+
+    replay_dead_letters(args.paths, args.reasons, args.output_dir, args.dry_run)
@@ -0,0 +1,287 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import signal
+import time
+import pymongo
+import dead_letter
+import glamira_config
+import metrics
+import raw_data_transform
+from bson import json_util
+from bson.json_util import CANONICAL_JSON_OPTIONS
+
+# Read app, MongoDB and GCS configs once, with ${VAR} values resolved from the environment and .env
+config = glamira_config.load_config()
+
+# Setup logging format and level
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# MongoDB connection parameters
+mongodb_uri = config["mongodb"]["uri"]
+db_name = config["mongodb"]["database"]
+main_collection_name = "userbeh"
+
+# Micro-batch bounds and resume token location
+max_batch_size = 5000
+max_batch_seconds = 10
+resume_token_file = "stream_resume_token.json"
+raw_events_table_id = "striking-figure-445310-d1.glamira_data.raw_events"
+
+
+class LocalFileSink:
+    """
+    Writes each micro-batch as a JSONL file in a local directory, for testing against a local replica set.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, rows, batch_name):
+        with open(os.path.join(self.output_dir, f"{batch_name}.jsonl"), 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(row, default=str) + '\n' for row in rows))
+        return []
+
+
+class GcsSink:
+    """
+    Uploads each micro-batch as a JSONL object under gs://bucket/prefix/.
+    """
+
+    def __init__(self, bucket_name, prefix="userbeh_stream"):
+        from google.cloud import storage
+
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def upload(self, rows, batch_name):
+        blob_name = f"{self.prefix}/{batch_name}.jsonl"
+        data = "".join(json.dumps(row, default=str) + '\n' for row in rows)
+        self.bucket.blob(blob_name).upload_from_string(data, content_type="application/x-ndjson")
+        return f"gs://{self.bucket_name}/{blob_name}"
+
+    def write(self, rows, batch_name):
+        self.upload(rows, batch_name)
+        return []
+
+
+class BigQueryLoadSink(GcsSink):
+    """
+    Stages each micro-batch in GCS, then appends it to the raw events table with a (free) load job.
+    """
+
+    def __init__(self, bucket_name, table_id, prefix="userbeh_stream"):
+        from google.cloud import bigquery
+
+        super().__init__(bucket_name, prefix)
+        self.table_id = table_id
+        self.client = bigquery.Client(project=table_id.split(".")[0])
+        self.job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+
+    def write(self, rows, batch_name):
+        uri = self.upload(rows, batch_name)
+        with metrics.span("bigquery_load"):
+            self.client.load_table_from_uri(uri, self.table_id, job_config=self.job_config).result()
+        return []
+
+
+class LocalStoragePath:
+    """
+    Stands in for the storage client of the dead-letter writer with the file sink:
+    client.bucket(name).blob(name).upload_from_string() writes to <directory>/<bucket>/<blob> instead of GCS.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def bucket(self, bucket_name):
+        return LocalStoragePath(os.path.join(self.path, bucket_name))
+
+    def blob(self, blob_name):
+        return LocalStoragePath(os.path.join(self.path, blob_name))
+
+    def upload_from_string(self, data, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+class BigQueryInsertSink:
+    """
+    Streams each micro-batch into the raw events table with the loader function's insert_rows retry.
+    """
+
+    def __init__(self, table_id):
+        from google.cloud import bigquery
+
+        self.client = bigquery.Client(project=table_id.split(".")[0])
+        self.table = self.client.get_table(table_id)
+
+    def write(self, rows, batch_name):
+        return dead_letter.insert_rows_with_retry(self.client, self.table, rows)
+
+
+def read_resume_token():
+    try:
+        with open(resume_token_file, 'r') as f:
+            return json_util.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def write_resume_token(token):
+    # Write then rename so a crash never leaves a truncated token
+    temporary_path = f"{resume_token_file}.tmp"
+    with open(temporary_path, 'w') as f:
+        f.write(json_util.dumps(token))
+    os.replace(temporary_path, resume_token_file)
+
+
+def transform_events(documents, dead_letters):
+    """
+    Converts change stream documents to mongoexport's canonical extended JSON and runs process_data_chunk.
+    Events the transform rejects are dead-lettered without failing the batch.
+    Returns the rows and the (position, event) pairs they came from, in the same order.
+    """
+
+    events = [json.loads(json_util.dumps(document, json_options=CANONICAL_JSON_OPTIONS)) for document in documents]
+    batch = list(enumerate(events))
+    try:
+        return raw_data_transform.process_data_chunk(events), batch
+    except Exception:
+        rows = []
+        transformed = []
+        for position, event in batch:
+            try:
+                rows.extend(raw_data_transform.process_data_chunk([event]))
+                transformed.append((position, event))
+            except Exception as e:
+                metrics.count("errors")
+                dead_letters.reject(dead_letter.TRANSFORM, event, e, position)
+        return rows, transformed
+
+
+class MicroBatcher:
+    """
+    Buffers change events and flushes them to the sink when the batch is full or old enough.
+    The resume token is only persisted after the sink accepted the batch and the events it could
+    not take were dead-lettered (at-least-once delivery).
+    """
+
+    def __init__(self, sink, batch_size, batch_seconds, dead_letter_storage):
+        self.sink = sink
+        self.dead_letter_storage = dead_letter_storage
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.documents = []
+        self.cluster_times = []
+        self.first_buffered_at = None
+        self.resume_token = None
+
+    def add(self, change):
+        if not self.documents:
+            self.first_buffered_at = time.monotonic()
+        self.documents.append(change["fullDocument"])
+        self.cluster_times.append(change["clusterTime"].time)
+        self.resume_token = change["_id"]
+
+    def due(self):
+        if not self.documents:
+            return False
+        return (len(self.documents) >= self.batch_size
+                or time.monotonic() - self.first_buffered_at >= self.batch_seconds)
+
+    def flush(self, resume_token=None):
+        resume_token = resume_token or self.resume_token
+        if self.documents:
+            batch_name = f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%d_%H%M%S_%f}"
+            # Rejected events are dead-lettered as mongoexport lines, so the replay script can feed them to raw_data
+            dead_letters = dead_letter.DeadLetterWriter(self.dead_letter_storage, "stream_userbeh", config["gcs"]["bucket"],
+                                                        f"{main_collection_name}_stream/{batch_name}")
+            with metrics.span("transform"):
+                rows, batch = transform_events(self.documents, dead_letters)
+            with metrics.span("sink_write"):
+                rejected = self.sink.write(rows, batch_name)
+            dead_letters.reject_insert_errors(rejected, batch)
+            # Raises before the token is written if the dead letters cannot be stored
+            dead_letters.close()
+
+            # Lag = time between the event being committed in Mongo and its batch reaching the sink
+            now = time.time()
+            for cluster_time in self.cluster_times:
+                metrics.observe("ingest_lag_seconds", now - cluster_time)
+            max_lag = now - min(self.cluster_times)
+            metrics.count("rows", len(rows) - len(rejected))
+            logging.info(f"Flushed {len(rows) - len(rejected)} rows as {batch_name}, max lag {max_lag:.1f}s")
+            metrics.flush("stream_userbeh", batch=batch_name, max_lag_seconds=round(max_lag, 3))
+
+            self.documents = []
+            self.cluster_times = []
+        if resume_token is not None:
+            write_resume_token(resume_token)
+
+
+def stream_userbeh(sink, batch_size, batch_seconds, dead_letter_storage):
+    batcher = MicroBatcher(sink, batch_size, batch_seconds, dead_letter_storage)
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    client = pymongo.MongoClient(mongodb_uri)
+    try:
+        collection = client[db_name][main_collection_name]
+        resume_token = read_resume_token()
+        logging.info(f"Watching '{main_collection_name}' " + ("from saved resume token" if resume_token else "from now"))
+
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        with collection.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000) as stream:
+            while not stopping:
+                change = stream.try_next()
+                if change is not None:
+                    batcher.add(change)
+                if batcher.due():
+                    batcher.flush()
+                elif change is None and not batcher.documents and stream.resume_token is not None:
+                    # Idle: keep the token current so a restart does not replay the quiet period
+                    write_resume_token(stream.resume_token)
+            batcher.flush(stream.resume_token)
+        logging.info("Change stream closed")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream new userbeh events to GCS/BigQuery in micro-batches.")
+    parser.add_argument("--sink", choices=["file", "gcs", "bigquery-load", "bigquery-insert"], default="bigquery-load")
+    parser.add_argument("--output-dir", default="stream_batches", help="directory of the file sink")
+    parser.add_argument("--batch-size", type=int, default=max_batch_size)
+    parser.add_argument("--batch-seconds", type=float, default=max_batch_seconds)
+    args = parser.parse_args()
+
+    if args.sink == "file":
+        batch_sink = LocalFileSink(args.output_dir)
+        dead_letter_storage = LocalStoragePath(os.path.join(args.output_dir, "dead_letters"))
+    else:
+        from google.cloud import storage
+
+        dead_letter_storage = storage.Client()
+        if args.sink == "gcs":
+            batch_sink = GcsSink(config["gcs"]["bucket"])
+        elif args.sink == "bigquery-load":
+            batch_sink = BigQueryLoadSink(config["gcs"]["bucket"], raw_events_table_id)
+        else:
+            batch_sink = BigQueryInsertSink(raw_events_table_id)
+
+    stream_userbeh(batch_sink, args.batch_size, args.batch_seconds, dead_letter_storage)
@@ -0,0 +1,65 @@
+"""
+Copies the modules shared with the Cloud Functions from src/ into the function directories,
+so each function deploys on its own with the same code the scripts and benchmarks run.
+
+    python src/py_scripts_sync_function_modules.py          # before deploying a function
+    python src/py_scripts_sync_function_modules.py --check  # exits non-zero when a copy is stale
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(SRC_DIR, "py_cloud_functions")
+
+# Shared module -> function directories it is copied into
+SHARED_MODULES = {
+    "metrics.py": ["raw_data", "ip_locations", "product_details"],
+    "dead_letter.py": ["raw_data", "ip_locations", "product_details"],
+    "raw_data_transform.py": ["raw_data"],
+}
+
+
+def stale_copies():
+    """
+    Returns the (source, copy) paths of the copies that are missing or differ from src/.
+    """
+
+    stale = []
+    for module, functions in SHARED_MODULES.items():
+        source = os.path.join(SRC_DIR, module)
+        for function in functions:
+            copy = os.path.join(FUNCTIONS_DIR, function, module)
+            if not os.path.exists(copy) or not filecmp.cmp(source, copy, shallow=False):
+                stale.append((source, copy))
+    return stale
+
+
+def sync_function_modules(check=False):
+    """
+    Copies the stale shared modules into the function directories, or with check=True only reports them.
+    Returns the stale (source, copy) pairs found.
+    """
+
+    stale = stale_copies()
+    for source, copy in stale:
+        copy_name = os.path.relpath(copy, SRC_DIR)
+        if check:
+            print(f"{copy_name} is out of sync with {os.path.basename(source)}")
+        else:
+            shutil.copyfile(source, copy)
+            print(f"Copied {os.path.basename(source)} to {copy_name}")
+    if check and stale:
+        print("Run python src/py_scripts_sync_function_modules.py to update the copies")
+    return stale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy the shared modules into the Cloud Function directories.")
+    parser.add_argument("--check", action="store_true", help="only compare the copies; exit 1 when one is stale")
+    args = parser.parse_args()
+
+    if sync_function_modules(args.check) and args.check:
+        sys.exit(1)